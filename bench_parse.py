@@ -0,0 +1,77 @@
+'''
+Parse-throughput benchmark for the county page extractor in lw_crawler
+
+Runs lw_crawler.extract_results_table over a corpus of saved county pages
+(by default the pages in the crawler's HTTP cache) and, for comparison,
+a full BeautifulSoup parse of the same pages.
+'''
+
+import glob
+import json
+import os
+import sys
+import time
+import bs4
+import http_cache
+import lw_crawler
+
+
+def load_corpus(corpus_dir=http_cache.CACHE_DIR):
+    '''
+    Reads the saved pages of a corpus.
+    Inputs:
+        corpus_dir(str): directory of saved pages, either an http_cache
+            directory (*.body files) or a directory of html files.
+    Returns:
+        pages(list): the pages as strings.
+    '''
+    filenames = sorted(glob.glob(os.path.join(corpus_dir, "*.body")))
+    if not filenames:
+        filenames = sorted(filename for filename in glob.glob(os.path.join(corpus_dir, "*"))
+                           if os.path.isfile(filename))
+    pages = []
+    for filename in filenames:
+        with open(filename, "rb") as file:
+            pages.append(file.read().decode("utf-8", errors="replace"))
+    return pages
+
+
+def time_parser(parse, pages, repeat):
+    '''
+    Best time over repeat runs of parse over every page.
+    '''
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            parse(page)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def go(corpus_dir=http_cache.CACHE_DIR, repeat=5):
+    '''
+    Runs the benchmark.
+    Inputs:
+        corpus_dir(str): directory of saved pages (see load_corpus).
+        repeat(int): runs per parser, the best one is reported.
+    Returns:
+        results(dict): pages, megabytes and, per parser, seconds, pages per
+            second and megabytes per second.
+    '''
+    pages = load_corpus(corpus_dir)
+    megabytes = sum(len(page) for page in pages) / 2**20
+    results = {"pages": len(pages), "megabytes": megabytes}
+    parsers = {"extract_results_table": lw_crawler.extract_results_table,
+               "bs4_full_parse": lambda page: bs4.BeautifulSoup(page, "html.parser")}
+    for name, parse in parsers.items():
+        seconds = time_parser(parse, pages, repeat)
+        results[name] = {"seconds": seconds,
+                         "pages_per_second": len(pages) / seconds,
+                         "megabytes_per_second": megabytes / seconds}
+    return results
+
+
+if __name__ == "__main__":
+    usage = "python3 bench_parse.py [corpus_dir]"
+    print(json.dumps(go(*sys.argv[1:2]), indent=2))
@@ -0,0 +1,310 @@
+'''
+Benchmark of the household engine stages on synthetic Census and MIT data
+
+Generates raw data with the shapes of income_buckets.json,
+household_sizes.json, county_info.json and living_wage_data.csv at the
+size of Illinois, ten states or the whole country (see SCALES), by
+resampling and perturbing the counties of the Illinois raw data. The
+stages of the household engine are then run on it in memory and each is
+timed and its peak memory measured:
+
+    gen_hh_data           gen_hh_level_data.process_income_data and gen_hh_data
+    gen_lw_dict           gen_lw_dict.process_hh_type_county and compile_wages
+    create_lw_vars        gen_agg_data.create_lw_vars
+    create_new_wage_vars  gen_agg_data.create_new_wage_vars
+    agg_data              gen_agg_data.agg_data and gen_new_vars
+
+The same stages run on the Illinois raw data must reproduce the master
+data in GOLDEN_FILE, up to the noise of the unemployment draws in the
+SEED_COLUMNS. Results are JSON, compare diffs two of them.
+'''
+
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import employment_model
+import gen_agg_data
+import gen_hh_level_data
+import gen_lw_dict
+
+#number of states and counties per state of each scale, the country has
+#about 3,140 counties in 50 states and DC
+SCALES = {"illinois": (1, 102), "ten_states": (10, 62), "national": (51, 62)}
+STAGES = ["gen_hh_data", "gen_lw_dict", "create_lw_vars", "create_new_wage_vars",
+          "agg_data"]
+#synthetic raw data is written here, outside the tracked data (see .gitignore)
+BENCH_DIR = "bench_data/tmp"
+#master data of the Illinois raw data at a $15 wage with the CBO model, made
+#by the original code (gen_agg_data.go(15, True)) before the draws of who
+#loses their job were seeded per county
+GOLDEN_FILE = "bench_data/golden_master_data.csv"
+GOLDEN_WAGE = 15
+#columns that depend on which hhs are drawn to lose their job, the others
+#only on the number drawn
+SEED_COLUMNS = ["New Wage Agg Income", "UB LW Agg Income", "LB LW Agg Income",
+                "Cost UB LW v New Wage", "Cost LB LW v New Wage"]
+
+
+def load_raw(raw_dir="raw_data"):
+    '''
+    Reads the raw data of a directory.
+    Inputs:
+        raw_dir(str): directory with the four raw data files.
+    Returns:
+        (tuple) income buckets, household sizes, county info and living
+        wage DataFrame.
+    '''
+    raw_data = []
+    for name in ["income_buckets.json", "household_sizes.json", "county_info.json"]:
+        with open(os.path.join(raw_dir, name), "r") as file:
+            raw_data.append(json.load(file))
+    raw_data.append(pd.read_csv(os.path.join(raw_dir, "living_wage_data.csv")))
+    return tuple(raw_data)
+
+
+def synthetic_data(num_states, counties_per_state, seed=0, hh_scale=1.0,
+                   template_dir="raw_data"):
+    '''
+    Generates raw data for made up counties, each a copy of a random
+    county of the template data with its household counts multiplied by
+    a random factor and its living wages by another.
+    Inputs:
+        num_states(int): number of states.
+        counties_per_state(int): number of counties in each state.
+        seed(int): seed of the random numbers.
+        hh_scale(float): multiplies all household counts, below 1 for
+            quick runs at a large number of counties.
+        template_dir(str): directory of the raw data to resample.
+    Returns:
+        (tuple) income buckets, household sizes, county info and living
+        wage DataFrame. With more than one state, counties are keyed by
+        their 5 digit FIPS code instead of the county code, as the stages
+        treat the data as one region.
+    '''
+    income_status, household_sizes, county_info, living_wage_df = load_raw(template_dir)
+    hh_by_county = {hh["county"]: hh for hh in household_sizes}
+    templates = [(income, hh_by_county[income["county"]],
+                  next(iter(county_info[income["county"]])))
+                 for income in income_status]
+    lw_groups = dict(list(living_wage_df.groupby("County", sort=False)))
+    rng = np.random.default_rng(seed)
+
+    new_income, new_hh, new_info, new_lw = [], [], {}, []
+    for state in range(1, num_states + 1):
+        for county in range(1, 2 * counties_per_state, 2):
+            fips = f"{state:02d}{county:03d}"
+            code = fips if num_states > 1 else fips[2:]
+            name = f"County {fips}"
+            income, hh, template_name = templates[rng.integers(len(templates))]
+            factor = rng.lognormal(0, 0.5) * hh_scale
+            lw_factor = rng.uniform(0.9, 1.1)
+
+            new_income.append(scale_counts(income, factor, fips[:2], code))
+            new_hh.append(scale_counts(hh, factor, fips[:2], code))
+            new_info[code] = {name: fips}
+            lw_df = lw_groups[template_name].assign(County=name)
+            lw_df["Living Wage"] = (lw_df["Living Wage"] * lw_factor).round(2)
+            new_lw.append(lw_df)
+
+    return new_income, new_hh, new_info, pd.concat(new_lw, ignore_index=True)
+
+
+def scale_counts(row, factor, state, county):
+    '''
+    Census row with its counts multiplied by factor and rounded.
+    '''
+    new_row = {var: float(round(value * factor)) for var, value in row.items()
+               if var not in ("state", "county")}
+    new_row.update({"state": state, "county": county})
+    return new_row
+
+
+def write_raw(raw_dir, income_status, household_sizes, county_info, living_wage_df):
+    '''
+    Saves raw data under the file names the pipeline reads.
+    '''
+    os.makedirs(raw_dir, exist_ok=True)
+    for name, data in [("income_buckets.json", income_status),
+                       ("household_sizes.json", household_sizes),
+                       ("county_info.json", county_info)]:
+        with open(os.path.join(raw_dir, name), "w") as file:
+            json.dump(data, file)
+    living_wage_df.to_csv(os.path.join(raw_dir, "living_wage_data.csv"), index=False)
+
+
+def measure(results, name, trace_memory, func, *args):
+    '''
+    Runs a stage and records its seconds and output rows and, if
+    trace_memory, the peak memory it allocated and the peak RSS of the
+    process so far.
+    '''
+    if trace_memory:
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    output = func(*args)
+    results[name] = {"seconds": time.perf_counter() - start, "rows": len(output)}
+    if trace_memory:
+        results[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1] - start_bytes
+        results[name]["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return output
+
+
+def run_stages(raw_data, new_wage=GOLDEN_WAGE, model=employment_model.CBO,
+               trace_memory=False):
+    '''
+    Runs the household engine on raw data, as gen_hh_level_data.go,
+    gen_lw_dict.go and gen_agg_data.go with full_gen do, without saving.
+    Inputs:
+        raw_data(tuple): output of load_raw or synthetic_data.
+        new_wage(float): proposed new federal minimum wage.
+        model(dict): coefficients of the employment model.
+        trace_memory(bool): whether to measure memory, which slows the
+            stages down.
+    Returns:
+        (tuple) county-level master data and a dict with the measurements
+        of each stage.
+    '''
+    income_status, household_sizes, county_info, living_wage_df = raw_data
+    results = {}
+
+    hh_df = measure(results, "gen_hh_data", trace_memory,
+                    lambda: gen_hh_level_data.gen_hh_data(
+                        gen_hh_level_data.process_income_data(income_status, county_info)))
+    living_wage_dict = measure(results, "gen_lw_dict", trace_memory,
+                               lambda: gen_lw_dict.compile_wages(
+                                   living_wage_df,
+                                   gen_lw_dict.process_hh_type_county(
+                                       [dict(hh) for hh in household_sizes], county_info)))
+
+    hh_df["index"] = hh_df.index
+    hh_df = hh_df.rename(columns={"Predicted Salary": "Current Agg Income"})
+    hh_lw_df = measure(results, "create_lw_vars", trace_memory,
+                       gen_agg_data.create_lw_vars, hh_df, living_wage_dict, model)
+    hh_nw_lw_df = measure(results, "create_new_wage_vars", trace_memory,
+                          gen_agg_data.create_new_wage_vars, hh_lw_df, new_wage, model)
+    master_df = measure(results, "agg_data", trace_memory,
+                        lambda: gen_agg_data.gen_new_vars(gen_agg_data.agg_data(hh_nw_lw_df)))
+
+    return master_df, results
+
+
+def check_golden(golden_file=GOLDEN_FILE, raw_dir="raw_data", rel_tol=1e-9, seed_tol=0.005):
+    '''
+    Checks that the stages reproduce the golden master data. The
+    SEED_COLUMNS can only match up to the noise of the draws, which is
+    below 0.3% of the county's Current Agg Income on the Illinois data.
+    Inputs:
+        golden_file(str): master data of the raw data at GOLDEN_WAGE.
+        raw_dir(str): directory of the raw data.
+        rel_tol(float): largest relative difference allowed.
+        seed_tol(float): largest difference allowed in the SEED_COLUMNS,
+            as a share of Current Agg Income.
+    Returns:
+        (dict) whether the master data matches and the largest difference
+        of each column that does not.
+    '''
+    master_df, _ = run_stages(load_raw(raw_dir))
+    master_df = master_df.reset_index(drop=True)
+    golden_df = pd.read_csv(golden_file, dtype={"FIP": str})
+
+    mismatches = {}
+    if list(master_df.columns) != list(golden_df.columns) or len(master_df) != len(golden_df):
+        mismatches["shape"] = {"columns": list(master_df.columns), "rows": len(master_df)}
+    else:
+        for col in golden_df.columns:
+            if not pd.api.types.is_numeric_dtype(golden_df[col]):
+                if not (master_df[col].astype(str) == golden_df[col].astype(str)).all():
+                    mismatches[col] = "differs"
+            elif col in SEED_COLUMNS:
+                diff = (master_df[col] - golden_df[col]).abs() / golden_df["Current Agg Income"]
+                if diff.max() > seed_tol:
+                    mismatches[col] = float(diff.max())
+            elif not np.allclose(master_df[col], golden_df[col], rtol=rel_tol, atol=0):
+                mismatches[col] = float((master_df[col] - golden_df[col]).abs().max())
+
+    return {"file": golden_file, "matches": not mismatches, "mismatches": mismatches}
+
+
+def go(scale="illinois", new_wage=GOLDEN_WAGE, seed=0, hh_scale=1.0, repeat=1,
+       golden_file=GOLDEN_FILE, filename=None):
+    '''
+    Runs the benchmark.
+    Inputs:
+        scale(str): one of SCALES.
+        new_wage(float): proposed new federal minimum wage.
+        seed(int): seed of the synthetic data.
+        hh_scale(float): multiplies all household counts.
+        repeat(int): timed runs, the best time of each stage is reported.
+            Memory is measured in one more run.
+        golden_file(str): golden master data to check, None to skip.
+        filename(str): file to save the results to as JSON.
+    Returns:
+        results(dict): the parameters, the size of the data, per stage the
+            seconds, output rows, peak traced bytes and peak RSS, and the
+            golden check.
+    '''
+    num_states, counties_per_state = SCALES[scale]
+    raw_dir = os.path.join(BENCH_DIR, scale)
+    write_raw(raw_dir, *synthetic_data(num_states, counties_per_state, seed, hh_scale))
+    raw_data = load_raw(raw_dir)
+
+    stages = {}
+    for _ in range(repeat):
+        _, run_results = run_stages(raw_data, new_wage)
+        for name, stage in run_results.items():
+            if name not in stages or stage["seconds"] < stages[name]["seconds"]:
+                stages[name] = stage
+    tracemalloc.start()
+    _, memory_results = run_stages(raw_data, new_wage, trace_memory=True)
+    tracemalloc.stop()
+    for name, stage in memory_results.items():
+        stages[name].update({key: stage[key] for key in ["peak_bytes", "max_rss_bytes"]})
+
+    results = {"scale": scale, "states": num_states, "counties": len(raw_data[2]),
+               "households": stages["gen_hh_data"]["rows"], "new_wage": new_wage,
+               "seed": seed, "hh_scale": hh_scale, "repeat": repeat,
+               "versions": {"python": sys.version.split()[0], "numpy": np.__version__,
+                            "pandas": pd.__version__},
+               "stages": stages,
+               "total_seconds": sum(stage["seconds"] for stage in stages.values())}
+    if golden_file is not None:
+        results["golden"] = check_golden(golden_file)
+
+    if filename is not None:
+        with open(filename, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+def compare(old_filename, new_filename):
+    '''
+    Ratio of the new to the old seconds and peak bytes of each stage of
+    two saved results, above 1 when the new run is slower or larger.
+    '''
+    with open(old_filename, "r") as file:
+        old = json.load(file)
+    with open(new_filename, "r") as file:
+        new = json.load(file)
+    return {name: {key: new["stages"][name][key] / old["stages"][name][key]
+                   for key in ["seconds", "peak_bytes"]}
+            for name in STAGES if name in old["stages"] and name in new["stages"]}
+
+
+if __name__ == "__main__":
+    usage = ("python3 bench_pipeline.py [scale] [wage] [hh_scale] [filename]\n" +
+             "python3 bench_pipeline.py compare <old_filename> <new_filename>")
+    if sys.argv[1:2] == ["compare"]:
+        print(json.dumps(compare(sys.argv[2], sys.argv[3]), indent=2))
+    else:
+        scale = sys.argv[1] if len(sys.argv) > 1 else "illinois"
+        new_wage = float(sys.argv[2]) if len(sys.argv) > 2 else GOLDEN_WAGE
+        new_wage = int(new_wage) if new_wage.is_integer() else new_wage
+        hh_scale = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+        filename = sys.argv[4] if len(sys.argv) > 4 else None
+        print(json.dumps(go(scale, new_wage, hh_scale=hh_scale, filename=filename), indent=2))
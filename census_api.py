@@ -2,36 +2,52 @@
 """Prep Census Data using API Author: Deniz Tokmakoglu"""
 
 import json
-from census import Census
+import sys
 from us import states
+import census_client
+import instrument
 
+#the key was provided to us by the census bureau.
+CENSUS_KEY = "68e0462c9f5c02a99a7a7bb477fa1ff3d83bedd2"
+YEAR = 2019
+INCOME_VARIABLES = ["DP03_0051E", "DP03_0052E", "DP03_0053E", "DP03_0054E",
+                    "DP03_0055E", "DP03_0056E", "DP03_0057E", "DP03_0058E",
+                    "DP03_0059E", "DP03_0060E", "DP03_0061E"]
+HH_SIZE_VARIABLES = ["B11016_002E", "B11016_004E", "B11016_005E",
+                     "B11016_006E", "B11016_007E", "B11016_008E",
+                     "B11016_010E", "B11016_011E", "B11016_012E",
+                     "B11016_013E", "B11016_014E", "B11016_015E",
+                     "B11016_016E"]
 
+
+@instrument.stage("census")
 def go(filename1 = "raw_data/income_buckets.json",
        filename2 = "raw_data/household_sizes.json",
-       filename3 = "raw_data/county_info.json"):
+       filename3 = "raw_data/county_info.json", state = "IL",
+       year = YEAR, base_url = census_client.BASE_URL, max_workers = 3,
+       use_cache = True, refresh = False):
     """
     Main function to get the Census API files.
     Input:
         filename1, 2, 3: filenames to save the raw data.
+        state: postal abbreviation, name or FIPS code of the state.
+        year: ACS 5-year estimates year.
+        base_url: url of the Census API (or of census_stub).
+        max_workers: number of requests in flight at once.
+        use_cache: whether to reuse responses cached by census_client.
+        refresh: whether to pull every response again even if it is
+            cached, replacing the cached ones.
     Returns:
-        Nothing. Saves the Files.
+        (tuple) income buckets, household sizes and county info.
+        Also saves the Files.
     """
-    # census object
-    #the key was provided to us by the census bureau.
-    census_key = "68e0462c9f5c02a99a7a7bb477fa1ff3d83bedd2"
-    c = Census(census_key, year = 2019)
-    # list of dictionaries, one per county in IL
-    county_codes_unprocessed = c.acs5dp.state_county('NAME', states.IL.fips, '*')
-    # lists of dictionaries
-    income_status = c.acs5dp.state_county(("DP03_0051E", "DP03_0052E", "DP03_0053E", "DP03_0054E",
-                                            "DP03_0055E", "DP03_0056E", "DP03_0057E", "DP03_0058E",
-                                            "DP03_0059E", "DP03_0060E", "DP03_0061E"),
-                                            states.IL.fips, '*', year = 2019)
-    household_sizes = c.acs5.state_county(("B11016_002E", "B11016_004E", "B11016_005E",
-                                            "B11016_006E", "B11016_007E", "B11016_008E",
-                                            "B11016_010E", "B11016_011E", "B11016_012E",
-                                            "B11016_013E", "B11016_014E", "B11016_015E",
-                                           "B11016_016E"), states.IL.fips, '*', year = 2019)
+    geography = census_client.county_geography(states.lookup(state).fips)
+    # lists of dictionaries, one per county in the state
+    county_codes_unprocessed, income_status, household_sizes = census_client.get(
+        [("acs5dp", year, geography, ["NAME"]),
+         ("acs5dp", year, geography, INCOME_VARIABLES),
+         ("acs5", year, geography, HH_SIZE_VARIABLES)],
+        CENSUS_KEY, base_url, max_workers, use_cache, refresh)
 
     county_info = process_county_codes(county_codes_unprocessed)
     
@@ -43,6 +59,8 @@ def go(filename1 = "raw_data/income_buckets.json",
     with open(filename3, "w") as file3:
         json.dump(county_info, file3)
 
+    return income_status, household_sizes, county_info
+
 def process_county_codes(lst):
     '''
     Takes list of dictionaries which include the county codes from
@@ -62,5 +80,5 @@ def process_county_codes(lst):
     return county_codes
 
 if __name__ == "__main__":
-    usage = "python3 census_api.py"
-    go()
+    usage = "python3 census_api.py [state]"
+    go(state=sys.argv[1] if len(sys.argv) > 1 else "IL")
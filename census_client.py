@@ -0,0 +1,232 @@
+'''
+Batched, cached and concurrent client for the Census ACS API
+
+A query is a dataset ("acs5" or "acs5dp"), a year, a geography and a
+list of variables. Variable lists longer than MAX_VARIABLES are split
+into batches, the batches of all queries are fetched concurrently
+through http_fetch (shared session, per-host rate limit, retries) and
+the batches of a query are merged back into one row per geography.
+Every batch response is cached on disk under CACHE_DIR by (dataset,
+year, geography, variables), so a repeated pull makes no requests. A
+refresh pull fetches every batch again and replaces the cached
+responses.
+
+Rows are returned like the census package returns them: a dict per
+geography with the variables as floats (None when the API has no
+value), followed by the geography columns as strings.
+
+census_stub.py serves recorded responses, pass its url as base_url to
+run without the network.
+'''
+
+import hashlib
+import json
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import http_fetch
+
+BASE_URL = "https://api.census.gov/data"
+DATASETS = {"acs5": "acs/acs5",
+            "acs5dp": "acs/acs5/profile"}
+#the API takes at most 50 variables per request
+MAX_VARIABLES = 50
+CACHE_DIR = "raw_data/census_cache"
+#columns that are not converted to numbers
+TEXT_COLUMNS = ["NAME", "GEO_ID", "state", "county"]
+
+STATS = {"cached": 0, "fetched": 0}
+
+_lock = threading.Lock()
+
+
+def count(stat):
+    '''
+    Adds one to a counter in STATS.
+    '''
+    with _lock:
+        STATS[stat] += 1
+
+
+def county_geography(state_fips, county="*"):
+    '''
+    Geography of the counties of a state
+    Inputs:
+        state_fips(str): FIPS code of the state.
+        county(str): FIPS code of the county within the state, "*" for all.
+    Returns:
+        (tuple) the "for" and "in" parameters of the query.
+    '''
+    return (f"county:{county}", f"state:{state_fips}")
+
+
+def batch_variables(variables, size=MAX_VARIABLES):
+    '''
+    Splits a variable list into batches the API accepts.
+    Inputs:
+        variables(list): variable names.
+        size(int): maximum number of variables per batch.
+    Returns:
+        list of tuples of variable names.
+    '''
+    variables = list(variables)
+    return [tuple(variables[i:i + size]) for i in range(0, len(variables), size)]
+
+
+def batch_key(dataset, year, geography, variables):
+    '''
+    Cache key of a batch
+    Inputs:
+        dataset(str): key of DATASETS.
+        year(int): ACS year.
+        geography(tuple): "for" and "in" parameters.
+        variables(tuple): variable names of the batch.
+    Returns:
+        (str) hex digest.
+    '''
+    key = json.dumps([dataset, int(year), list(geography), list(variables)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def batch_url(dataset, year, geography, variables, key=None, base_url=BASE_URL):
+    '''
+    Request url of a batch.
+    '''
+    params = {"get": ",".join(variables), "for": geography[0]}
+    if geography[1]:
+        params["in"] = geography[1]
+    if key:
+        params["key"] = key
+    return (f"{base_url}/{int(year)}/{DATASETS[dataset]}?" +
+            urllib.parse.urlencode(params, safe=",:*"))
+
+
+def load_batch(key):
+    '''
+    Reads a cached batch response.
+    Inputs:
+        key(str): output of batch_key.
+    Returns:
+        (list) the response table (header row first), or None.
+    '''
+    try:
+        with open(os.path.join(CACHE_DIR, key + ".json"), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def store_batch(key, table):
+    '''
+    Caches a batch response. The file is replaced atomically, so an
+    interrupted pull never leaves a broken entry.
+    '''
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, key + ".json")
+    with open(path + ".tmp", "w") as file:
+        json.dump(table, file)
+    os.replace(path + ".tmp", path)
+
+
+def get_batch(batch, key=None, base_url=BASE_URL, use_cache=True, refresh=False):
+    '''
+    Gets the response table of one batch, from the cache if it is there.
+    Inputs:
+        batch(tuple): dataset, year, geography and variables.
+        key(str): Census API key.
+        base_url(str): url of the API (or of census_stub).
+        use_cache(bool): whether to read and write CACHE_DIR.
+        refresh(bool): whether to fetch the batch even if it is cached,
+            replacing the cached response.
+    Returns:
+        (list) the response table, header row first.
+    '''
+    cache_key = batch_key(*batch)
+    table = load_batch(cache_key) if use_cache and not refresh else None
+    if table is not None:
+        count("cached")
+        return table
+
+    #responses are cached here by query, not by url (which has the key)
+    url = batch_url(*batch, key=key, base_url=base_url)
+    r = http_fetch.fetch(url, {}, http_fetch.TIMEOUT, http_fetch.RETRIES)
+    if r is None or r.status_code != 200:
+        raise RuntimeError(f"Census API request failed: {batch_url(*batch, base_url=base_url)}")
+    table = r.json()
+    count("fetched")
+    if use_cache:
+        store_batch(cache_key, table)
+    return table
+
+
+def to_value(column, value):
+    '''
+    Converts a response value like the census package does.
+    '''
+    if column in TEXT_COLUMNS or value is None:
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def merge_tables(tables, variables):
+    '''
+    Merges the response tables of the batches of a query.
+    Inputs:
+        tables(list): response tables, one per batch.
+        variables(list): variables of the query, in order.
+    Returns:
+        list of dicts, one per geography in the order of the first table.
+    '''
+    rows = {}
+    geo_columns = []
+    for table in tables:
+        header = table[0]
+        geo_columns = [col for col in header if col not in variables]
+        for values in table[1:]:
+            row = dict(zip(header, values))
+            geo = tuple(row[col] for col in geo_columns)
+            rows.setdefault(geo, {}).update(row)
+
+    columns = list(variables) + geo_columns
+    return [{col: to_value(col, row[col]) for col in columns}
+            for row in rows.values()]
+
+
+def get(queries, key=None, base_url=BASE_URL, max_workers=4, use_cache=True,
+        refresh=False):
+    '''
+    Runs a list of queries, fetching their batches concurrently.
+    Inputs:
+        queries(list): tuples of dataset, year, geography and variables.
+        key(str): Census API key.
+        base_url(str): url of the API (or of census_stub).
+        max_workers(int): number of requests in flight at once.
+        use_cache(bool): whether to read and write CACHE_DIR.
+        refresh(bool): whether to fetch every batch again, see get_batch.
+    Returns:
+        list with the rows of each query, in the order of queries.
+    '''
+    batches = []
+    for dataset, year, geography, variables in queries:
+        assert dataset in DATASETS, f"dataset must be one of {list(DATASETS)}"
+        batches.append([(dataset, year, tuple(geography), vars_batch)
+                        for vars_batch in batch_variables(variables)])
+
+    flat = [batch for query_batches in batches for batch in query_batches]
+    http_fetch.set_pool_size(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(lambda batch: get_batch(batch, key, base_url, use_cache,
+                                                           refresh),
+                                   flat))
+
+    results = []
+    start = 0
+    for query, query_batches in zip(queries, batches):
+        results.append(merge_tables(tables[start:start + len(query_batches)],
+                                    list(query[3])))
+        start += len(query_batches)
+    return results
@@ -0,0 +1,106 @@
+'''
+Local stand-in for the Census ACS API
+
+Serves the batch responses recorded in a census_client cache directory,
+so census_client (and census_api.go) can run against it with no network:
+
+    server = census_stub.start()
+    census_api.go(..., base_url=census_stub.url(server))
+    server.shutdown()
+
+A request whose response was not recorded gets a 404, like an unknown
+query on the real API.
+'''
+
+import json
+import os
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import census_client
+
+DATASET_PATHS = {path: dataset for dataset, path in census_client.DATASETS.items()}
+
+
+def parse_request(path):
+    '''
+    Turns a request path into the batch it asks for.
+    Inputs:
+        path(str): path and query string of the request.
+    Returns:
+        (tuple) dataset, year, geography and variables, or None.
+    '''
+    parsed = urllib.parse.urlparse(path)
+    parts = parsed.path.strip("/").split("/")
+    if len(parts) < 3 or not parts[1].isdigit():
+        return None
+    dataset = DATASET_PATHS.get("/".join(parts[2:]))
+    params = urllib.parse.parse_qs(parsed.query)
+    if dataset is None or "get" not in params or "for" not in params:
+        return None
+    geography = (params["for"][0], params.get("in", [""])[0])
+    variables = tuple(params["get"][0].split(","))
+    return dataset, int(parts[1]), geography, variables
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    '''
+    Answers GET requests from the recordings in server.cache_dir.
+    '''
+
+    def do_GET(self):
+        batch = parse_request(self.path)
+        table = None
+        if batch is not None:
+            path = os.path.join(self.server.cache_dir,
+                                census_client.batch_key(*batch) + ".json")
+            if os.path.exists(path):
+                with open(path, "r") as file:
+                    table = json.load(file)
+
+        if table is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps(table).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(cache_dir=census_client.CACHE_DIR, port=0):
+    '''
+    Starts the stub server in a background thread.
+    Inputs:
+        cache_dir(str): directory of recorded responses.
+        port(int): port to listen on, 0 for any free port.
+    Returns:
+        the server, stop it with server.shutdown().
+    '''
+    server = ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+    server.cache_dir = cache_dir
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def url(server):
+    '''
+    Base url of a running stub server, to pass as base_url.
+    '''
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/data"
+
+
+if __name__ == "__main__":
+    usage = "python3 census_stub.py [port] [cache_dir]"
+    server = ThreadingHTTPServer(("127.0.0.1", int(sys.argv[1]) if len(sys.argv) > 1 else 8000),
+                                 ReplayHandler)
+    server.cache_dir = sys.argv[2] if len(sys.argv) > 2 else census_client.CACHE_DIR
+    print("Serving recorded Census responses at", url(server))
+    server.serve_forever()
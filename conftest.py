@@ -0,0 +1,49 @@
+"""
+Fixtures shared by the tests
+"""
+
+import http.server
+import os
+import threading
+import pytest
+import bench_pipeline
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "raw_data")
+
+
+@pytest.fixture
+def write_synthetic():
+    '''
+    Writes a small synthetic raw data set (see bench_pipeline.synthetic_data)
+    to a directory, with the living wages of one county raised if
+    changed_county is given.
+    '''
+    def write(raw_dir, changed_county=None, counties=4, hh_scale=0.02):
+        income_status, household_sizes, county_info, living_wage_df = \
+            bench_pipeline.synthetic_data(1, counties, seed=1, hh_scale=hh_scale,
+                                          template_dir=TEMPLATE_DIR)
+        if changed_county is not None:
+            rows = living_wage_df["County"] == changed_county
+            living_wage_df.loc[rows, "Living Wage"] += 1
+        bench_pipeline.write_raw(raw_dir, income_status, household_sizes, county_info,
+                                 living_wage_df)
+    return write
+
+
+@pytest.fixture
+def serve():
+    '''
+    Starts a local HTTP server in a thread for a request handler class and
+    returns its base url. The servers are shut down after the test.
+    '''
+    servers = []
+
+    def start(handler):
+        httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,42 @@
+"""
+Employment response to a higher minimum wage
+
+The share of affected workers who lose their job at a wage is linear in
+the wage: (wage * slope - intercept) / scale. CBO holds the coefficients
+of the CBO model ("The Effects on Employment and Family Income of
+Increasing the Federal Minimum Wage") the model uses by default; other
+dictionaries with the same keys describe other elasticities.
+"""
+
+import itertools
+
+CBO = {"slope": 0.26579, "intercept": 2.74474, "scale": 155.76}
+COEFFICIENTS = ["slope", "intercept", "scale"]
+
+
+def unemp_rate(wage, model=CBO):
+    '''
+    Share of the workers at or below a wage who lose their job
+
+    Inputs:
+        - wage (float or array): hourly wage
+        - model (dictionary): slope, intercept and scale of the model
+    Outputs:
+        - (float or array) unemployment rate
+    '''
+    return (wage * model["slope"] - model["intercept"])/model["scale"]
+
+
+def grid(slopes=(CBO["slope"],), intercepts=(CBO["intercept"],),
+         scales=(CBO["scale"],)):
+    '''
+    All combinations of the given coefficient values
+
+    Inputs:
+        - slopes, intercepts, scales (lists of floats): values of each
+                                                         coefficient
+    Outputs:
+        - (list of dictionaries) one model per combination
+    '''
+    return [dict(zip(COEFFICIENTS, values))
+            for values in itertools.product(slopes, intercepts, scales)]
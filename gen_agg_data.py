@@ -6,11 +6,36 @@ Author: Caton Brewster
 """
 
 import json
+import os
 import pandas as pd
 import numpy as np
 import sys
-
-def go(new_wage=15, full_gen=False, filename="clean_data/master_data.csv"):
+from concurrent.futures import ProcessPoolExecutor
+import employment_model
+import gen_bin_agg_data
+import gen_hh_level_data
+import hh_store
+import instrument
+import scenario_cache
+
+ENGINES = ["household", "bin", "stream"]
+#base seed of the unemployment draws, combined with the FIPS code of
+#each county so a county's draws do not depend on the others
+SEED = 1
+#columns of the county-level data, in order
+AGG_COLUMNS = ["County", "FIP", "County Size", "Entered Wage", "County UB LW",
+               "County LB LW", "Current Agg Income", "New Wage Agg Income",
+               "UB LW Agg Income", "LB LW Agg Income",
+               "% Below LB Living Wage at Inputted Min. Wage",
+               "% Below UB Living Wage at Inputted Min. Wage",
+               "% Affected by New Wage", "% Affected by UB LW", "% Affected by LB LW",
+               "Unemployed at New Wage", "Unemployed at UB LW", "Unemployed at LB LW"]
+
+@instrument.stage("master_data")
+def go(new_wage=15, full_gen=False, filename="clean_data/master_data.csv",
+       engine="household", file_format="store", use_cache=True,
+       cache_max_bytes=scenario_cache.MAX_BYTES, raw_dir="raw_data",
+       clean_dir="clean_data", max_workers=1, model=employment_model.CBO):
     '''
     Run all functions needed to create a master aggregated wage dataset
     based on Census data and MIT Living Wage Caculator
@@ -19,38 +44,282 @@ def go(new_wage=15, full_gen=False, filename="clean_data/master_data.csv"):
         - new_wage (int): proposed new federal minimum wage
         - full_gen (boolean): whether to regenerate all underyling data
         - filename (string): filename to save dataset to
+        - engine (string): "household" to aggregate the hh-level data,
+                           "bin" to compute the aggregates in closed form
+                           from the income bins (see gen_bin_agg_data) or
+                           "stream" to generate and aggregate the hh-level
+                           data one county at a time (see stream_agg_data)
+        - file_format (string): format of the hh-level data, "store"
+                                (binary columnar) or "csv", see hh_store
+        - use_cache (boolean): whether to reuse results of earlier runs
+                               with the same wage, model and data, kept
+                               in clean_dir/scenario_cache
+        - cache_max_bytes (int): byte budget of the result cache
+        - raw_dir, clean_dir (string): directories of the raw and clean
+                                       data (per state ones in national)
+        - max_workers (int): number of processes the stream engine
+                             spreads the counties over
+        - model (dictionary): coefficients of the employment model, see
+                              employment_model. Living wage job losses
+                              stored under another model are recomputed
     Outputs:
         - (DataFrame): aggregated dataset
     '''
+    assert engine in ENGINES, f"engine must be one of {ENGINES}"
 
-    if full_gen:
+    if full_gen and engine == "household":
         # regenerate underlying data
-        with open("clean_data/living_wages_by_county.json", "r") as file:
+        hh_lw_df = gen_lw_data(file_format, clean_dir=clean_dir, model=model)
+
+    hh_lw_filename = os.path.join(clean_dir, "hh_level_data_w_lw")
+    key = scenario_key(new_wage, engine, file_format, raw_dir, clean_dir,
+                       model) if use_cache else None
+    cache_dir = scenario_cache.cache_dir_for(clean_dir)
+    agg_df_w_vars = scenario_cache.get(key, cache_dir) if use_cache else None
+
+    if agg_df_w_vars is None:
+        if engine == "bin":
+            agg_df = gen_bin_agg_data.go(new_wage, raw_dir=raw_dir, clean_dir=clean_dir,
+                                         model=model)
+        elif engine == "stream":
+            agg_df = stream_agg_data(new_wage, raw_dir=raw_dir, clean_dir=clean_dir,
+                                     max_workers=max_workers, model=model)
+        elif full_gen:
+            agg_df = agg_data(create_new_wage_vars(hh_lw_df, new_wage, model))
+        elif file_format == "store":
+            # memory-mapped, only the pages of the columns used are read
+            meta, hh_lw_arrays = hh_store.open_store(hh_lw_filename)
+            agg_df = agg_new_wage_vars(hh_lw_arrays, meta, new_wage, model)
+        else:
+            try:
+                hh_lw_df = load_lw_data(file_format, clean_dir, model)
+            except:
+                print("hh_level_data_w_lw doesn't exist yet")
+                print("run go() function with full_gen=True to generate")
+            agg_df = agg_data(create_new_wage_vars(hh_lw_df, new_wage, model))
+
+        agg_df_w_vars = gen_new_vars(agg_df)
+        if use_cache:
+            scenario_cache.put(key, agg_df_w_vars, cache_dir, max_bytes=cache_max_bytes)
+
+    agg_df_w_vars.to_csv(filename, index = False)
+
+    return agg_df_w_vars
+
+
+def go_batch(wages, filename="clean_data/master_data_batch.csv", file_format="store",
+             clean_dir="clean_data", model=employment_model.CBO):
+    '''
+    Creates the master data for several wages with the household engine,
+    loading the hh-level data with living wage vars only once
+
+    Inputs:
+        - wages (list of floats): proposed new federal minimum wages
+        - filename (string): filename to save the combined dataset to
+        - file_format (string): format of the hh-level data, see hh_store
+        - clean_dir (string): directory of the clean data
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame): aggregated datasets of all wages stacked, one row
+                       per county and wage
+    '''
+    hh_lw_filename = os.path.join(clean_dir, "hh_level_data_w_lw")
+    if file_format == "store":
+        meta, hh_lw_arrays = hh_store.open_store(hh_lw_filename)
+        hh_lw_arrays = {col: np.array(values) for col, values in hh_lw_arrays.items()}
+    else:
+        hh_lw_df = load_lw_data(file_format, clean_dir, model)
+
+    frames = []
+    for new_wage in wages:
+        if file_format == "store":
+            agg_df = agg_new_wage_vars(hh_lw_arrays, meta, new_wage, model)
+        else:
+            agg_df = agg_data(create_new_wage_vars(hh_lw_df, new_wage, model))
+        frames.append(gen_new_vars(agg_df))
+
+    batch_df = pd.concat(frames, ignore_index=True)
+    batch_df.to_csv(filename, index = False)
+
+    return batch_df
+
+
+def parse_wages(arg):
+    '''
+    Reads wages from the command line: one wage ("12.5"), a comma
+    separated list ("12,13.5,15") or a start:stop:step range with the
+    stop included ("10:20:0.5"). A step of 0 raises a ValueError
+
+    Inputs:
+        - arg (string): command line argument
+    Outputs:
+        - (list of floats) wages, whole ones as ints
+    '''
+    if ":" in arg:
+        start, stop, step = [float(value) for value in arg.split(":")]
+        if step == 0:
+            raise ValueError(f"step of {arg} must not be 0")
+        wages = start + step * np.arange(int(round((stop - start) / step)) + 1)
+        wages = [round(float(wage), 10) for wage in wages]
+    else:
+        wages = [float(value) for value in arg.split(",")]
+    return [int(wage) if float(wage).is_integer() else wage for wage in wages]
+
+
+def scenario_key(new_wage, engine, file_format, raw_dir="raw_data", clean_dir="clean_data",
+                 model=employment_model.CBO):
+    '''
+    Key of a result in the scenario cache: the wage, the engine, the code
+    of the model and a content hash of the data it is computed from
+
+    Inputs:
+        - new_wage (int): user-inputted minimum wage
+        - engine (string): "household", "bin" or "stream"
+        - file_format (string): format of the hh-level data, see hh_store
+        - raw_dir, clean_dir (string): directories of the raw and clean data
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (string) cache key
+    '''
+    if engine in ["bin", "stream"]:
+        data = scenario_cache.hash_files([os.path.join(raw_dir, "income_buckets.json"),
+                                          os.path.join(raw_dir, "county_info.json"),
+                                          os.path.join(clean_dir, "living_wages_by_county.json")])
+    else:
+        data = hh_store.digest(os.path.join(clean_dir, "hh_level_data_w_lw"), file_format)
+    code = scenario_cache.hash_files([__file__, gen_bin_agg_data.__file__,
+                                      gen_hh_level_data.__file__, hh_store.__file__,
+                                      employment_model.__file__])
+
+    return scenario_cache.make_key(new_wage=new_wage, engine=engine,
+                                   data=data, code=code, model=model)
+
+
+def gen_lw_data(file_format="store", hh_df=None, living_wage_dict=None,
+                clean_dir="clean_data", model=employment_model.CBO):
+    '''
+    Generates and saves the hh-level data with living wage vars, which
+    does not depend on the new wage
+
+    Inputs:
+        - file_format (string): format of the hh-level data, see hh_store
+        - hh_df (DataFrame): output of gen_hh_level_data.go, read from
+                             clean_data if not given
+        - living_wage_dict (Dictionary): output of gen_lw_dict.go, read
+                                         from clean_dir if not given
+        - clean_dir (string): directory of the clean data
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) hh-level data with living wage vars
+    '''
+    if living_wage_dict is None:
+        with open(os.path.join(clean_dir, "living_wages_by_county.json"), "r") as file:
+            living_wage_dict = json.load(file)
+
+    if hh_df is None:
+        hh_df = hh_store.load(os.path.join(clean_dir, "hh_level_data"), file_format)
+    hh_df["index"] = hh_df.index
+    hh_df = hh_df.rename(columns={"Predicted Salary":'Current Agg Income'})
+
+    hh_lw_df = create_lw_vars(hh_df, living_wage_dict, model)
+    hh_store.save(hh_lw_df, os.path.join(clean_dir, "hh_level_data_w_lw"), file_format,
+                  model)
+
+    return hh_lw_df
+
+
+def load_lw_data(file_format="store", clean_dir="clean_data", model=employment_model.CBO):
+    '''
+    Loads the hh-level data with living wage vars. If it was generated
+    with another employment model (or one that was not recorded) the
+    living wage vars are recomputed with the given one
+
+    Inputs:
+        - file_format (string): format of the hh-level data, see hh_store
+        - clean_dir (string): directory of the clean data
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) hh-level data with living wage vars
+    '''
+    hh_lw_filename = os.path.join(clean_dir, "hh_level_data_w_lw")
+    hh_lw_df = hh_store.load(hh_lw_filename, file_format)
+    if hh_store.stored_model(hh_lw_filename, file_format) != model:
+        with open(os.path.join(clean_dir, "living_wages_by_county.json"), "r") as file:
             living_wage_dict = json.load(file)
+        hh_lw_df = create_lw_vars(hh_lw_df, living_wage_dict, model)
+    return hh_lw_df
+
+
+@instrument.stage("stream_aggregation")
+def stream_agg_data(new_wage, living_wage_dict=None, raw_dir="raw_data",
+                    clean_dir="clean_data", max_workers=1,
+                    model=employment_model.CBO):
+    '''
+    Generates the hh-level data of one county at a time from the raw
+    Census income bins, runs it through the living wage and new wage
+    vars and keeps only its county-level row, so memory is bounded by
+    the largest county. Gives the same result as the household engine
+    run with full_gen=True. With more than one worker the counties are
+    spread over a process pool; since every county draws from its own
+    seed (see county_seed) the result does not depend on max_workers.
 
-        hh_df = pd.read_csv("clean_data/hh_level_data.csv")
-        hh_df["index"] = hh_df.index
-        hh_df = hh_df.rename(columns={"Predicted Salary":'Current Agg Income'})
+    Inputs:
+        - new_wage (int): user-inputted minimum wage
+        - living_wage_dict (Dictionary): dictionary mapping county to
+                            living wages in each county (read from
+                            clean_dir if not given)
+        - raw_dir, clean_dir (string): directories of the raw and clean data
+        - max_workers (int): number of processes
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) county-level data, as agg_data
+    '''
+    with open(os.path.join(raw_dir, "income_buckets.json"), "r") as file:
+        county_income_info = json.load(file)
 
-        hh_lw_df = create_lw_vars(hh_df, living_wage_dict)
-        hh_lw_df.to_csv("clean_data/hh_level_data_w_lw.csv", index = True)
+    with open(os.path.join(raw_dir, "county_info.json"), "r") as file:
+        county_id_info = json.load(file)
+
+    if living_wage_dict is None:
+        with open(os.path.join(clean_dir, "living_wages_by_county.json"), "r") as file:
+            living_wage_dict = json.load(file)
+
+    c_df = gen_hh_level_data.process_income_data(county_income_info, county_id_info)
+    county_c_dfs = [county_c_df for _, county_c_df in c_df.groupby("FIP", sort=False)]
+    args = ([living_wage_dict] * len(county_c_dfs), [new_wage] * len(county_c_dfs),
+            [model] * len(county_c_dfs))
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = list(executor.map(county_agg_data, county_c_dfs, *args))
     else:
-        try:
-            hh_lw_df = pd.read_csv("clean_data/hh_level_data_w_lw.csv")
-        except:
-            print("hh_level_data_w_lw.csv doesn't exist yet")
-            print("run go() function with full_gen=True to generate")
+        rows = list(map(county_agg_data, county_c_dfs, *args))
 
-    hh_nw_lw_df = create_new_wage_vars(hh_lw_df, new_wage)
-    agg_df = agg_data(hh_nw_lw_df)
-    agg_df_w_vars = gen_new_vars(agg_df)
+    return pd.concat(rows).sort_index()
 
-    agg_df_w_vars.to_csv(filename, index = False)
 
-    return agg_df_w_vars
+def county_agg_data(county_c_df, living_wage_dict, new_wage, model=employment_model.CBO):
+    '''
+    Generates the hh-level data of one county and aggregates it
+
+    Inputs:
+        - county_c_df (DataFrame): income bins of the county, from
+                                   gen_hh_level_data.process_income_data
+        - living_wage_dict (Dictionary): dictionary mapping county to
+                            living wages in each county
+        - new_wage (int): user-inputted minimum wage
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) the county-level row, as agg_data
+    '''
+    hh_df = gen_hh_level_data.gen_hh_data(county_c_df.copy())
+    hh_df["index"] = hh_df.index
+    hh_df = hh_df.rename(columns={"Predicted Salary":'Current Agg Income'})
+    hh_lw_df = create_lw_vars(hh_df, living_wage_dict, model)
+    return agg_data(create_new_wage_vars(hh_lw_df, new_wage, model))
 
 
-def create_lw_vars(hh_df, living_wage_dict):
+@instrument.stage("lw_assignment")
+def create_lw_vars(hh_df, living_wage_dict, model=employment_model.CBO):
     '''
     Generates hh-level variables related to the lower bound and
     upper bound living wage
@@ -59,37 +328,34 @@ def create_lw_vars(hh_df, living_wage_dict):
         - hh_df: (Dataframe) hh-level income data
         - living_wage_dict: (Dictionary) dictionary mapping county to
                             living wages in each county
+        - model: (Dictionary) coefficients of the employment model
     '''
     for bound in ["UB LW", "LB LW"]:
 
-        hh_df["County " + bound] = hh_df.apply(lambda row:
-                                        living_wage_dict[row["County"]][bound],
-                                        axis=1)
+        county_lw = {county: wages[bound] for county, wages in living_wage_dict.items()}
+        hh_df["County " + bound] = hh_df["County"].map(county_lw).astype(float)
 
         hh_df["% Affected by " + bound] = (hh_df["Hourly Wage"] <
                                         hh_df["County " + bound])
 
-        hh_df[bound + " Wage"] = hh_df.apply(lambda row:
-                                    living_wage_dict[row["County"]][bound]
-                                    if row["Hourly Wage"] <=
-                                    living_wage_dict[row["County"]][bound]
-                                    else row["Hourly Wage"], axis=1)
+        hh_df[bound + " Wage"] = np.maximum(hh_df["Hourly Wage"],
+                                            hh_df["County " + bound])
 
         #choose random subset based on the unemployment model to lose job
-        hh_df[bound + " # Unemp. by County"] = hh_df.apply(lambda row:
-                                               int(((row[bound + " Wage"] *
-                                               0.26579 - 2.74474)/155.76) *
-                                               row["County Size"]), axis=1)
-
-        hh_df.loc[hh_df.groupby('County').apply(
-                                            lambda x:
-                                            x[x["Hourly Wage"] <=
-                                            x["County " + bound]].sample(int(
-                                            x[x["Hourly Wage"] <=
-                                            x["County " + bound]]
-                                            [bound + " # Unemp. by County"].mean()),
-                                            random_state=1))["index"],
-                                            bound + " Wage"] = 0
+        hh_df[bound + " # Unemp. by County"] = np.trunc(
+            employment_model.unemp_rate(hh_df[bound + " Wage"], model) *
+            hh_df["County Size"]).astype(int)
+
+        #every eligible hh in a county is at the county LW, so the count is
+        #the same for all of them and only needs computing once per county
+        county_df = hh_df.groupby("County")[["County " + bound, "County Size"]].first()
+        num_unemp = np.trunc(employment_model.unemp_rate(county_df["County " + bound], model) *
+                             county_df["County Size"]).astype(int)
+
+        eligible = (hh_df["Hourly Wage"] <= hh_df["County " + bound]).values
+        unemployed = draw_unemployed(hh_df["County"], eligible, num_unemp,
+                                     county_seeds(hh_df))
+        hh_df.loc[unemployed, bound + " Wage"] = 0
 
         hh_df[bound + " Agg Income"] = (hh_df[bound + " Wage"] *
                                         hh_df["Hours"] * 52.14)
@@ -98,17 +364,99 @@ def create_lw_vars(hh_df, living_wage_dict):
     return hh_df
 
 
-def create_new_wage_vars(hh_lw_df, new_wage):
+def county_seed(fips):
+    '''
+    Seed of the unemployment draws of a county, derived from SEED and
+    its FIPS code only, so the draws are the same however the counties
+    are split between processes
+
+    Inputs:
+        - fips (string): FIPS code of the county
+    Outputs:
+        - (int) seed for np.random.RandomState
+    '''
+    return int(np.random.SeedSequence([SEED, int(fips)]).generate_state(1)[0])
+
+
+def county_seeds(hh_df):
+    '''
+    Seeds of the counties of hh-level data
+
+    Inputs:
+        - hh_df (DataFrame): hh-level data with County and FIP columns
+    Outputs:
+        - (dictionary) county to seed
+    '''
+    fips = hh_df.groupby("County")["FIP"].first()
+    return {county: county_seed(fip) for county, fip in zip(fips.index, fips)}
+
+
+@instrument.stage("sampling")
+def draw_unemployed(counties, eligible, num_unemp, seeds):
+    '''
+    Chooses a random subset of the eligible hhs in each county to lose
+    their job. The hhs of a county are drawn in row order with the
+    county's own seed, the same way
+    x[eligible].sample(n, random_state=seed) would draw them.
+
+    Inputs:
+        - counties (Series): county of each hh
+        - eligible (array of booleans): whether each hh can lose their job
+        - num_unemp (Series): number of hhs to draw, indexed by county
+                              (clipped to the number of eligible hhs)
+        - seeds (dictionary): seed of each county, see county_seed
+    Outputs:
+        - (array of booleans) whether each hh is drawn as unemployed
+    '''
+    unemployed = np.zeros(len(counties), dtype=bool)
+    codes, county_names = pd.factorize(counties, sort=True)
+    eligible_pos = np.flatnonzero(eligible)
+    eligible_codes = codes[eligible_pos]
+    order = np.argsort(eligible_codes, kind="stable")
+    eligible_pos = eligible_pos[order]
+    bounds = np.searchsorted(eligible_codes[order],
+                             np.arange(len(county_names) + 1))
+
+    for code, county in enumerate(county_names):
+        county_pos = eligible_pos[bounds[code]:bounds[code + 1]]
+        if len(county_pos) == 0:
+            continue
+        unemployed[county_pos[draw(len(county_pos), num_unemp[county],
+                                   seeds[county])]] = True
+
+    return unemployed
+
+
+def draw(num_eligible, num_unemp, seed):
+    '''
+    Draws the positions of the hhs of a county that lose their job among
+    its eligible hhs. Other models than the CBO one can ask for more hhs
+    than are eligible, or fewer than none, so the count is clipped.
+
+    Inputs:
+        - num_eligible (int): number of eligible hhs
+        - num_unemp (int): number of hhs to draw
+        - seed (int): seed of the county, see county_seed
+    Outputs:
+        - (array of ints) positions among the eligible hhs
+    '''
+    size = min(max(int(num_unemp), 0), num_eligible)
+    return np.random.RandomState(seed).choice(num_eligible, size=size, replace=False)
+
+
+@instrument.stage("new_wage_vars")
+def create_new_wage_vars(hh_lw_df, new_wage, model=employment_model.CBO):
     '''
     Generate hh-level variables related to the user-inputted wage
 
     Inputs:
         - hh_lw_df (DataFrame): hh-level income data with living wage vars
         - new_wage (int): user-inputted minimum wage
+        - model (Dictionary): coefficients of the employment model
     '''
 
     #CBO model of unemployment
-    unemp_model = (new_wage * 0.26579 - 2.74474)/155.76
+    unemp_model = employment_model.unemp_rate(new_wage, model)
 
     hh_lw_df["Entered Wage"] = new_wage
     hh_lw_df["% Affected by New Wage"] = (hh_lw_df["Hourly Wage"] <
@@ -117,13 +465,11 @@ def create_new_wage_vars(hh_lw_df, new_wage):
                                     new_wage, hh_lw_df["Hourly Wage"])
 
     #choose random subset to lose job, with same rate applied to each county
-    hh_lw_df.loc[hh_lw_df.groupby('County').apply(
-                                            lambda x:
-                                            x[x["Hourly Wage"] <=
-                                            new_wage].sample(
-                                            int(unemp_model*len(x)),
-                                            random_state=1))["index"],
-                                            "New Wage"] = 0
+    num_unemp = (unemp_model * hh_lw_df.groupby("County").size()).astype(int)
+    eligible = (hh_lw_df["Hourly Wage"] <= new_wage).values
+    unemployed = draw_unemployed(hh_lw_df["County"], eligible, num_unemp,
+                                 county_seeds(hh_lw_df))
+    hh_lw_df.loc[unemployed, "New Wage"] = 0
 
     hh_lw_df["New Wage Agg Income"] = (hh_lw_df["New Wage"] *
                                        hh_lw_df["Hours"] * 52.14)
@@ -136,6 +482,7 @@ def create_new_wage_vars(hh_lw_df, new_wage):
     return hh_lw_df
 
 
+@instrument.stage("aggregation")
 def agg_data(hh_nw_lw_df):
     '''
     Aggregates hh-level data into county-level data with outcomes of interest
@@ -166,6 +513,127 @@ def agg_data(hh_nw_lw_df):
     return agg_df
 
 
+@instrument.stage("aggregation")
+def agg_new_wage_vars(hh_lw_arrays, meta, new_wage, model=employment_model.CBO):
+    '''
+    Generates the user-inputted wage variables and aggregates them into
+    county-level data in one pass over column arrays, without building a
+    hh-level DataFrame. Gives the same result as
+    agg_data(create_new_wage_vars(hh_lw_df, new_wage)).
+
+    Inputs:
+        - hh_lw_arrays (dictionary): column name to array of the hh-level
+                                     data with living wage vars, e.g. the
+                                     memory maps from hh_store.open_store
+        - meta (dictionary): store description with the dictionaries of
+                             encoded columns and the county row ranges
+        - new_wage (int): user-inputted minimum wage
+        - model (dictionary): coefficients of the employment model. If the
+                              store was generated with another one (or
+                              one that was not recorded) its living wage
+                              vars are recomputed with this one
+    '''
+    fips = {col_meta["name"]: col_meta for col_meta in meta["columns"]}["FIP"]
+    same_model = meta.get("model") == model
+
+    rows = []
+    for county, (start, stop) in sorted(meta["county_index"].items()):
+        county_arrays = {col: values[start:stop] for col, values in hh_lw_arrays.items()}
+        county_fips = fips["dictionary"][county_arrays["FIP"][0]]
+
+        row = {"County": county,
+               "FIP": county_fips,
+               "County Size": county_arrays["County Size"][0],
+               "Entered Wage": new_wage,
+               "County UB LW": county_arrays["County UB LW"][0],
+               "County LB LW": county_arrays["County LB LW"][0],
+               "Current Agg Income": county_arrays["Current Agg Income"].sum()}
+        if same_model:
+            for bound in ["UB LW", "LB LW"]:
+                row[bound + " Agg Income"] = county_arrays[bound + " Agg Income"].sum()
+                row["% Affected by " + bound] = county_arrays["% Affected by " + bound].mean()
+                row["Unemployed at " + bound] = county_arrays["Unemployed at " + bound].mean()
+        else:
+            row.update(county_lw_vars(county_arrays, county_seed(county_fips), model))
+        row.update(county_new_wage_vars(county_arrays, county_seed(county_fips),
+                                        new_wage, model))
+        rows.append(row)
+
+    return reorder_agg_columns(pd.DataFrame(rows))
+
+
+def county_lw_vars(county_arrays, seed, model=employment_model.CBO):
+    '''
+    Aggregated living wage variables of one county, computed from its
+    wage-independent arrays. Gives the same values as agg_data of
+    create_lw_vars.
+
+    Inputs:
+        - county_arrays (dictionary): column name to array of the county's
+                                      hh-level data with Hourly Wage, Hours,
+                                      County Size and County UB/LB LW
+        - seed (int): seed of the county, see county_seed
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (dictionary) agg_data column to value
+    '''
+    hourly_wage = county_arrays["Hourly Wage"]
+    row = {}
+    for bound in ["UB LW", "LB LW"]:
+        lw = county_arrays["County " + bound][0]
+        lw_wage = np.maximum(hourly_wage, lw)
+        num_unemp = np.trunc(employment_model.unemp_rate(lw, model) *
+                             county_arrays["County Size"][0])
+        eligible_pos = np.flatnonzero(hourly_wage <= lw)
+        lw_wage[eligible_pos[draw(len(eligible_pos), num_unemp, seed)]] = 0
+
+        row[bound + " Agg Income"] = (lw_wage * county_arrays["Hours"] * 52.14).sum()
+        row["% Affected by " + bound] = (hourly_wage < lw).mean()
+        row["Unemployed at " + bound] = (lw_wage == 0).mean()
+    return row
+
+
+def county_new_wage_vars(county_arrays, seed, new_wage, model=employment_model.CBO):
+    '''
+    Aggregated user-inputted wage variables of one county, computed from
+    its wage-independent arrays
+
+    Inputs:
+        - county_arrays (dictionary): column name to array of the county's
+                                      hh-level data with Hourly Wage, Hours
+                                      and County UB/LB LW
+        - seed (int): seed of the county, see county_seed
+        - new_wage (int): user-inputted minimum wage
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (dictionary) agg_data column to value
+    '''
+    hourly_wage = county_arrays["Hourly Wage"]
+    new_wage_col = np.where(hourly_wage <= new_wage, new_wage, hourly_wage)
+    eligible_pos = np.flatnonzero(hourly_wage <= new_wage)
+    num_unemp = employment_model.unemp_rate(new_wage, model) * len(hourly_wage)
+    new_wage_col[eligible_pos[draw(len(eligible_pos), num_unemp, seed)]] = 0
+
+    return {"New Wage Agg Income": (new_wage_col * county_arrays["Hours"] * 52.14).sum(),
+            "% Below LB Living Wage at Inputted Min. Wage":
+                (new_wage_col <= county_arrays["County LB LW"]).mean(),
+            "% Below UB Living Wage at Inputted Min. Wage":
+                (new_wage_col <= county_arrays["County UB LW"]).mean(),
+            "% Affected by New Wage": (hourly_wage < new_wage).mean(),
+            "Unemployed at New Wage": (new_wage_col == 0).mean()}
+
+
+def reorder_agg_columns(agg_df):
+    '''
+    Puts county-level rows built column by column in the column order of
+    agg_data, indexed by county
+
+    Input:
+        - agg_df (DataFrame): county-level data with a County column
+    '''
+    return agg_df[AGG_COLUMNS].set_index("County", drop=False).rename_axis("County")
+
+
 def gen_new_vars(agg_df):
     '''
     Takes the aggregated county-level DataFrame and creates any
@@ -189,8 +657,66 @@ def gen_new_vars(agg_df):
     return agg_df
 
 
+def compare_engines(new_wage=15, rel_tol=0.0025, abs_tol=0.005, file_format="store",
+                    raw_dir="raw_data", clean_dir="clean_data", model=employment_model.CBO):
+    '''
+    Checks the bin engine against the household engine for a wage on
+    every column of the master data. Dollar columns (incomes and costs)
+    are compared relative to the county's Current Agg Income and the
+    other columns in absolute terms.
+
+    The household engine draws which hhs lose their job, the bin engine
+    takes the expected value, so they can only agree up to the noise of
+    the draw. On the Illinois data at $15 changing SEED moves the
+    household engine's incomes and costs by up to 0.22% of Current Agg
+    Income, and the bin engine is within 0.2% of it. A cost is the
+    difference of two incomes and can be small next to them (Cost LB LW
+    v New Wage moves by up to 10% of itself with the seed), which is why
+    the county's income is the reference.
+
+    Inputs:
+        - new_wage (int): user-inputted minimum wage
+        - rel_tol (float): largest difference allowed for dollar columns,
+                           as a share of Current Agg Income
+        - abs_tol (float): largest absolute difference allowed for the
+                           other columns
+        - file_format (string): format of the hh-level data, see hh_store
+        - raw_dir, clean_dir (string): directories of the raw and clean data
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) largest difference for each column and whether
+                      it is within tolerance
+    '''
+    hh_lw_df = load_lw_data(file_format, clean_dir, model)
+    hh_df = gen_new_vars(agg_data(create_new_wage_vars(hh_lw_df, new_wage, model)))
+    bin_df = gen_new_vars(gen_bin_agg_data.go(new_wage, raw_dir=raw_dir, clean_dir=clean_dir,
+                                              model=model)).set_index("County")
+
+    rows = []
+    for col in hh_df.columns.drop(["County", "FIP"]):
+        diff = (bin_df[col] - hh_df[col]).abs()
+        if "Agg Income" in col or col.startswith("Cost"):
+            diff = diff / hh_df["Current Agg Income"].abs()
+            rows.append([col, diff.max(), diff.max() <= rel_tol])
+        else:
+            rows.append([col, diff.max(), diff.max() <= abs_tol])
+
+    return pd.DataFrame(rows, columns=["Column", "Max Diff", "Within Tolerance"])
+
+
 if __name__ == "__main__":
-    usage = "python3 gen_agg_data.py"
-    new_wage = int(sys.argv[1])
+    usage = ("python3 gen_agg_data.py <wage> <full_gen> [engine]\n" +
+             "python3 gen_agg_data.py <wage,wage,...|start:stop:step> <full_gen>")
     full_gen = bool(int(sys.argv[2]))
-    go(new_wage, full_gen)
\ No newline at end of file
+    try:
+        wages = parse_wages(sys.argv[1])
+    except ValueError as e:
+        sys.exit(f"{e}\nusage: {usage}")
+    if "," in sys.argv[1] or ":" in sys.argv[1]:
+        if full_gen:
+            gen_lw_data()
+        go_batch(wages)
+    else:
+        new_wage = wages[0]
+        engine = sys.argv[3] if len(sys.argv) > 3 else "household"
+        go(new_wage, full_gen, engine=engine)
\ No newline at end of file
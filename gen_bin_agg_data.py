@@ -0,0 +1,222 @@
+"""
+Generate the county-level aggregated dataset directly from the Census
+income bins, without expanding the bins to one row per household.
+
+Within a bin with n households, household k earns lb + k * increment,
+so every count, hours total and income total used by gen_agg_data.agg_data
+is an arithmetic series over a range of k and has a closed form.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import employment_model
+import gen_hh_level_data
+import instrument
+
+#wage floor and full time salary used in gen_hh_level_data.gen_hh_data
+MIN_HOURLY_WAGE = 10
+FULL_TIME_SALARY = 20800
+
+
+@instrument.stage("bin_aggregation")
+def go(new_wage=15, living_wage_dict=None, raw_dir="raw_data", clean_dir="clean_data",
+       model=employment_model.CBO):
+    '''
+    Compute the county-level aggregates for a new wage from the raw
+    Census income bins and the county living wages
+
+    Inputs:
+        - new_wage (int): proposed new federal minimum wage
+        - living_wage_dict (Dictionary): dictionary mapping county to
+                            living wages in each county (read from
+                            clean_dir if not given)
+        - raw_dir, clean_dir (string): directories of the raw and clean
+                                       data (per state ones in national)
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame): county-level data with the columns of
+                       gen_agg_data.agg_data
+    '''
+    with open(os.path.join(raw_dir, "income_buckets.json"), "r") as file:
+        county_income_info = json.load(file)
+
+    with open(os.path.join(raw_dir, "county_info.json"), "r") as file:
+        county_id_info = json.load(file)
+
+    if living_wage_dict is None:
+        with open(os.path.join(clean_dir, "living_wages_by_county.json"), "r") as file:
+            living_wage_dict = json.load(file)
+
+    c_df = gen_hh_level_data.process_income_data(county_income_info, county_id_info)
+    bin_df = gen_bin_data(c_df)
+
+    return agg_bin_data(bin_df, living_wage_dict, new_wage, model)
+
+
+def gen_bin_data(c_df):
+    '''
+    Takes a dataframe with one row per income bin per county and adds the
+    salary grid of each bin (the households gen_hh_data would create)
+
+    Inputs:
+        - c_df (DataFrame): income bracket info for each county
+    Outputs:
+        - (DataFrame) one row per county and bin with a known salary range
+    '''
+    bin_df = c_df[c_df["Bins"].isin(gen_hh_level_data.BIN_LBS.keys()) &
+                  (c_df["Num HHs in Bin"] > 0)].copy()
+    bin_df["lb"] = bin_df["Bins"].map(gen_hh_level_data.BIN_LBS)
+    bin_df["ub"] = bin_df["Bins"].map(gen_hh_level_data.BIN_UBS)
+    bin_df["increment"] = (bin_df["ub"] - bin_df["lb"]) / bin_df["Num HHs in Bin"]
+
+    return bin_df.reset_index(drop=True)
+
+
+def num_hhs_below(bin_df, salary):
+    '''
+    Number of households in each bin earning strictly less than salary
+
+    Inputs:
+        - bin_df (DataFrame): output of gen_bin_data
+        - salary (array): salary threshold for each bin
+    Outputs:
+        - (array) number of households
+    '''
+    k = np.ceil((salary - bin_df["lb"].values) / bin_df["increment"].values) - 1
+    return np.clip(k, 0, bin_df["Num HHs in Bin"].values)
+
+
+def salary_sum(bin_df, num_hhs):
+    '''
+    Total salary of the num_hhs lowest earning households in each bin
+
+    Inputs:
+        - bin_df (DataFrame): output of gen_bin_data
+        - num_hhs (array): number of households in each bin
+    Outputs:
+        - (array) total salary
+    '''
+    return (num_hhs * bin_df["lb"].values +
+            bin_df["increment"].values * num_hhs * (num_hhs + 1) / 2)
+
+
+def wage_to_salary(wage, inclusive):
+    '''
+    Salary threshold at which the rounded hourly wage of a household
+    is below (or at, if inclusive) the given wage. Households under the
+    full time salary are all paid the minimum hourly wage.
+
+    Inputs:
+        - wage (array): hourly wage for each bin
+        - inclusive (boolean): whether an hourly wage equal to wage counts
+    Outputs:
+        - (array) salary threshold
+    '''
+    if inclusive:
+        return np.where(wage >= MIN_HOURLY_WAGE, wage * 2080 + 10.4, 0)
+    return np.where(wage > MIN_HOURLY_WAGE, wage * 2080 - 10.4, 0)
+
+
+def sum_eligible(bin_df, wage):
+    '''
+    Number, total hours and total salary of the households in each bin
+    whose hourly wage is at or below the given wage
+
+    Inputs:
+        - bin_df (DataFrame): output of gen_bin_data
+        - wage (array): hourly wage for each bin
+    Outputs:
+        - (tuple of arrays) number of households, hours, salary
+    '''
+    num_eligible = num_hhs_below(bin_df, wage_to_salary(wage, True))
+    num_part_time = np.minimum(num_eligible,
+                               num_hhs_below(bin_df, np.full(len(bin_df), FULL_TIME_SALARY)))
+    hours = (salary_sum(bin_df, num_part_time) / (MIN_HOURLY_WAGE * 52) +
+             (num_eligible - num_part_time) * 40)
+    return num_eligible, hours, salary_sum(bin_df, num_eligible)
+
+
+def agg_bin_data(bin_df, living_wage_dict, new_wage, model=employment_model.CBO):
+    '''
+    Aggregates the bin-level data into county-level data with outcomes of
+    interest. Job losses are applied at their expected value: the income of
+    a random subset of the eligible households is the subset's share of the
+    eligible households' income.
+
+    Inputs:
+        - bin_df (DataFrame): output of gen_bin_data
+        - living_wage_dict (Dictionary): dictionary mapping county to
+                            living wages in each county
+        - new_wage (int): user-inputted minimum wage
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) county-level data with the columns of
+                      gen_agg_data.agg_data
+    '''
+    bin_df = bin_df.copy()
+    bin_df["Current Agg Income"] = salary_sum(bin_df, bin_df["Num HHs in Bin"].values)
+    wages = {"New Wage": np.full(len(bin_df), float(new_wage))}
+    for bound in ["UB LW", "LB LW"]:
+        bin_df["County " + bound] = bin_df["County"].map(
+            {county: lw[bound] for county, lw in living_wage_dict.items()})
+        wages[bound] = bin_df["County " + bound].values
+
+    for wage_col, wage in wages.items():
+        num_eligible, hours, salary = sum_eligible(bin_df, wage)
+        bin_df["Eligible " + wage_col] = num_eligible
+        bin_df["Eligible Hours " + wage_col] = hours
+        bin_df["Eligible Salary " + wage_col] = salary
+        bin_df["Affected " + wage_col] = num_hhs_below(bin_df, wage_to_salary(wage, False))
+
+    county_df = bin_df.groupby("County").agg("first")
+    county_df = county_df.join(bin_df.groupby("County").sum(numeric_only=True),
+                               rsuffix=" Sum")
+    num_hhs = county_df["Num HHs in Bin Sum"]
+
+    #CBO model of unemployment
+    unemp_rates = {wage_col: employment_model.unemp_rate(wage, model)
+                   for wage_col, wage in [("New Wage", new_wage),
+                                          ("UB LW", county_df["County UB LW"]),
+                                          ("LB LW", county_df["County LB LW"])]}
+    num_unemp = {"New Wage": np.trunc(unemp_rates["New Wage"] * num_hhs)}
+    for bound in ["UB LW", "LB LW"]:
+        num_unemp[bound] = np.trunc(unemp_rates[bound] * county_df["County Size"])
+
+    agg_df = pd.DataFrame({"County": county_df.index,
+                           "FIP": county_df["FIP"],
+                           "County Size": county_df["County Size"],
+                           "Entered Wage": new_wage,
+                           "County UB LW": county_df["County UB LW"],
+                           "County LB LW": county_df["County LB LW"],
+                           "Current Agg Income": county_df["Current Agg Income Sum"]})
+
+    for wage_col, agg_col in [("New Wage", "New Wage Agg Income"),
+                              ("UB LW", "UB LW Agg Income"),
+                              ("LB LW", "LB LW Agg Income")]:
+        wage = new_wage if wage_col == "New Wage" else county_df["County " + wage_col]
+        eligible = county_df["Eligible " + wage_col + " Sum"]
+        num_unemp[wage_col] = np.clip(num_unemp[wage_col], 0, eligible)
+        employed_share = np.where(eligible > 0, 1 - num_unemp[wage_col] / eligible, 0)
+        agg_df[agg_col] = 52.14 * (
+            wage * county_df["Eligible Hours " + wage_col + " Sum"] * employed_share +
+            (agg_df["Current Agg Income"] -
+             county_df["Eligible Salary " + wage_col + " Sum"]) / 52)
+
+    #a hh ends up at or below the LW if it stays at or below it after the
+    #new wage, or if it loses its job
+    for bound in ["LB", "UB"]:
+        agg_df[f"% Below {bound} Living Wage at Inputted Min. Wage"] = np.where(
+            new_wage <= county_df[f"County {bound} LW"],
+            county_df[f"Eligible {bound} LW Sum"],
+            num_unemp["New Wage"]) / num_hhs
+
+    agg_df["% Affected by New Wage"] = county_df["Affected New Wage Sum"] / num_hhs
+    agg_df["% Affected by UB LW"] = county_df["Affected UB LW Sum"] / num_hhs
+    agg_df["% Affected by LB LW"] = county_df["Affected LB LW Sum"] / num_hhs
+    agg_df["Unemployed at New Wage"] = num_unemp["New Wage"] / num_hhs
+    agg_df["Unemployed at UB LW"] = num_unemp["UB LW"] / num_hhs
+    agg_df["Unemployed at LB LW"] = num_unemp["LB LW"] / num_hhs
+
+    return agg_df
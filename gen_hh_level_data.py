@@ -6,6 +6,8 @@ Author: Caton Brewster
 import json
 import pandas as pd
 import numpy as np
+import hh_store
+import instrument
 
 
 INCOME_BIN_VARS = {"Less than 10K" : "DP03_0052E",
@@ -21,25 +23,45 @@ INCOME_BIN_VARS = {"Less than 10K" : "DP03_0052E",
 
 INCOME_BINS = INCOME_BIN_VARS.keys()
 
+#lower and upper bound of the salaries in each income bin
+#(bins not listed, i.e. 200K +, have unknown salaries)
+BIN_LBS = dict(zip(INCOME_BINS, [5200.00, 10000.00, 15000.00, 25000.00, 35000.00,
+                                 50000.00, 75000.00, 100000.00, 150000.00]))
+BIN_UBS = dict(zip(INCOME_BINS, [9999.99, 14999.99, 24999.99, 34999.99, 49999.99,
+                                 74999.99, 99999.99, 149999.99, 199999.99]))
 
-def go(filename="clean_data/hh_level_data.csv"):
+#the same bounds as arrays in INCOME_BINS order, for lookup by bin code
+BIN_LB_ARRAY = np.array([BIN_LBS.get(label, 0) for label in INCOME_BINS])
+BIN_UB_ARRAY = np.array([BIN_UBS.get(label, 0) for label in INCOME_BINS])
+
+#string columns the hh-level data holds as categoricals
+CATEGORY_COLUMNS = ["County", "FIP", "Bins"]
+
+
+def go(filename="clean_data/hh_level_data", file_format="store",
+       county_income_info=None, county_id_info=None):
     '''
     The main function to generate the hh_level data.
     Inputs:
-        -filename: the output filename
+        -filename: the output filename, without extension
+        -file_format: "store" (binary columnar) or "csv", see hh_store
+        -county_income_info, county_id_info: Census data, read from
+                                             raw_data if not given
     Returns:
         -hh_level_data(dataframe)
     '''
-    with open("raw_data/income_buckets.json", "r") as file:
-        county_income_info = json.load(file)
+    if county_income_info is None:
+        with open("raw_data/income_buckets.json", "r") as file:
+            county_income_info = json.load(file)
 
-    with open("raw_data/county_info.json", "r") as file:
-        county_id_info = json.load(file)
+    if county_id_info is None:
+        with open("raw_data/county_info.json", "r") as file:
+            county_id_info = json.load(file)
 
     c_df = process_income_data(county_income_info, county_id_info)
     hh_level_data = gen_hh_data(c_df)
 
-    hh_level_data.to_csv(filename, index = False)
+    hh_store.save(hh_level_data, filename, file_format)
 
     return hh_level_data
 
@@ -56,33 +78,23 @@ def process_income_data(county_income_info, county_id_info):
         - county_id_info: dictionary mapping county codes to names
     output: dataframe
     '''
-    df = pd.DataFrame()
-    for county_dct in county_income_info:
-        county_df = convert_dict_to_df(county_dct, county_id_info)
-        df = pd.concat([df, county_df])
-    return df.reset_index(drop=True)
-
-
-def convert_dict_to_df(county_dct, county_id_info):
-    '''
-    For a given dictionary associated with a county, builds a dataframe
-    which gives the number of people in each income bracket for the county
-    inputs:
-        - county_dct: dictionary
-        - county_id_info: dictionary mapping county code to county name
-    output: dataframe
-    '''
-    df = pd.DataFrame(INCOME_BINS, columns=["Bins"])
-    county_id = county_dct['county']
-    county_name_list = list(county_id_info[county_id].keys()) #ugly
-    county_name = county_name_list[0] #ugly
-    df["County"] = county_name
-    df["FIP"]  = county_id_info[county_id][county_name]
-    df["Num HHs in Bin"] = [county_dct[INCOME_BIN_VARS[label]] for label in df["Bins"]]
-    df["County Size"] = county_dct['DP03_0051E']
-    return df
-
-
+    income_df = pd.DataFrame(county_income_info)
+    num_bins = len(INCOME_BIN_VARS)
+    county_info = [county_id_info[county_id] for county_id in income_df["county"]]
+    county_names = [next(iter(info)) for info in county_info]
+    fips = [info[name] for info, name in zip(county_info, county_names)]
+
+    #counties x bins, flattened county by county
+    return pd.DataFrame({"Bins": np.tile(list(INCOME_BINS), len(income_df)),
+                         "County": np.repeat(county_names, num_bins),
+                         "FIP": np.repeat(fips, num_bins),
+                         "Num HHs in Bin": income_df[list(INCOME_BIN_VARS.values())]
+                                           .to_numpy().ravel(),
+                         "County Size": np.repeat(income_df["DP03_0051E"].to_numpy(),
+                                                  num_bins)})
+
+
+@instrument.stage("hh_expansion")
 def gen_hh_data(c_df):
     '''
     Takes a dataframe with one county per row and generates
@@ -90,31 +102,31 @@ def gen_hh_data(c_df):
     Inputs:
         - c_df (data frame with income bracket info for each county)
     Outputs:
-        - DataFrame with one row per HH in Illinois
+        - DataFrame with one row per HH in Illinois. County, FIP and
+          Bins are categoricals
     '''
 
-    lbs = [5200.00, 10000.00, 15000.00, 25000.00, 35000.00,
-            50000.00, 75000.00, 100000.00, 150000.00]
-    lb_dict = dict(zip(INCOME_BINS,lbs))
-    ubs = [9999.99, 14999.99, 24999.99, 34999.99, 49999.99,
-            74999.99, 99999.99, 149999.99, 199999.99]
-    ub_dict = dict(zip(INCOME_BINS,ubs))
-
     #create bounds + increment
-    c_df["lb"] = c_df.apply(lambda row: lb_dict.get(row["Bins"], 0), axis=1)
-    c_df["ub"] = c_df.apply(lambda row: ub_dict.get(row["Bins"], 0), axis=1)
+    bin_codes = pd.Categorical(c_df["Bins"], categories=list(INCOME_BINS)).codes
+    c_df["lb"] = BIN_LB_ARRAY[bin_codes]
+    c_df["ub"] = BIN_UB_ARRAY[bin_codes]
     c_df["increment"] = (c_df["ub"] - c_df["lb"]) / c_df["Num HHs in Bin"]
 
     # remove those above 200K - we don't know their salary
     c_df = c_df[c_df["Bins"] != "200K +"]
-    #expand data - 1 row per HH
-
-    df = pd.DataFrame({col:np.repeat(c_df[col].values, c_df['Num HHs in Bin'], axis=0)
-                        for col in c_df})
-    del df["Num HHs in Bin"]
-
-    #created Predicted Salary as cum sum of increment
-    df["cum increment"]  = df.groupby(['County','Bins'])['increment'].cumsum()
+    #expand data - 1 row per HH, repeating category codes instead of strings
+    num_hhs = c_df["Num HHs in Bin"].to_numpy().astype(int)
+    df = pd.DataFrame()
+    for col in c_df.columns.drop("Num HHs in Bin"):
+        if col in CATEGORY_COLUMNS:
+            codes, uniques = pd.factorize(c_df[col], sort=True)
+            df[col] = pd.Categorical.from_codes(np.repeat(codes, num_hhs), uniques)
+        else:
+            df[col] = np.repeat(c_df[col].to_numpy(), num_hhs)
+
+    #created Predicted Salary as cum sum of increment within each county bin
+    bin_rows = np.repeat(np.arange(len(c_df)), num_hhs)
+    df["cum increment"] = df["increment"].groupby(bin_rows).cumsum()
     df["Predicted Salary"] = df["lb"] + df["cum increment"]
     df["Predicted Salary"] = df["Predicted Salary"].round(2)
     df["Hourly Wage"] = df["Predicted Salary"] / 2080
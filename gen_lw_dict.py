@@ -4,7 +4,9 @@ Author: Deniz Tokmakoglu
 """
 
 import json
+import numpy as np
 import pandas as pd
+import instrument
 
 #Mapping Household Types to Familty types
 #(Matches Census Data to Living Wage Data) for Worst Case Scenario
@@ -33,24 +35,32 @@ HH_TYPES = {"1-person household": ["B11016_010E"],
                                   "B11016_015E", "B11016_016E"]}
 
 
-def go(filename="clean_data/living_wages_by_county.json"):
+@instrument.stage("lw_dict")
+def go(filename="clean_data/living_wages_by_county.json", hh_sizes_dicts=None,
+       county_info_dict=None, living_wage_df=None):
     '''
     The main function that reads all the raw data and generates the
     wages for different scenarios for each county.
     Inputs:
         -filename (str): output file name
+        -hh_sizes_dicts, county_info_dict, living_wage_df: raw data, read
+                                                           from raw_data
+                                                           if not given
     Returns:
         -wages_dictionary(nested dictionary): the dictionary that maps each county to the scenarios.
     '''
     try:
 
-        with open("raw_data/county_info.json", "r") as file:
-            county_info_dict = json.load(file)
+        if county_info_dict is None:
+            with open("raw_data/county_info.json", "r") as file:
+                county_info_dict = json.load(file)
 
-        with open("raw_data/household_sizes.json", "r") as file:
-            hh_sizes_dicts = json.load(file)
+        if hh_sizes_dicts is None:
+            with open("raw_data/household_sizes.json", "r") as file:
+                hh_sizes_dicts = json.load(file)
 
-        living_wage_df = pd.read_csv("raw_data/living_wage_data.csv")
+        if living_wage_df is None:
+            living_wage_df = pd.read_csv("raw_data/living_wage_data.csv")
 
     except Exception as e:
 
@@ -75,24 +85,20 @@ def process_hh_type_county(hh_sizes_dicts, county_info_dict):
         - county_info_dict(dictionary): Dictionary that maps county codes to county names
                                         and fips codes for IL.
     Returns:
-         -df(pandas dataframe): dataframe containing number of
-                                household type information for each county.
+         -df(pandas dataframe): dataframe containing the share of each
+                                household type (counties x HH_TYPES)
+                                and the county name.
     '''
-    df = pd.DataFrame(columns = HH_TYPES.keys())
-    for county_hh_dict in hh_sizes_dicts:
-        perc_per_type = {}
-        perc_per_type["County ID"] = county_info_dict[county_hh_dict['county']].values()
-        perc_per_type["County"] = county_info_dict[county_hh_dict.pop('county')].keys()
-        del county_hh_dict["state"]
-        num_hhs = sum(county_hh_dict.values())
-        for hh_type, var_lst in HH_TYPES.items():
-            num_in_hh_type = 0
-            for var in var_lst:
-                num_in_hh_type += county_hh_dict[var]
-            perc_per_type[hh_type] = [num_in_hh_type / num_hhs]
-        county_df = pd.DataFrame.from_dict(perc_per_type)
-        df = pd.concat([df,county_df])
-    df = df.set_index("County ID")
+    raw_df = pd.DataFrame(hh_sizes_dicts)
+    counts = raw_df.drop(columns=["state", "county"]).astype(float)
+    num_hhs = counts.sum(axis=1).to_numpy()
+
+    df = pd.DataFrame({hh_type: counts[var_lst].sum(axis=1).to_numpy() / num_hhs
+                       for hh_type, var_lst in HH_TYPES.items()})
+    county_info = [county_info_dict[code] for code in raw_df["county"]]
+    df["County"] = [next(iter(info)) for info in county_info]
+    df.index = pd.Index([next(iter(info.values())) for info in county_info],
+                        name="County ID")
 
     return df
 
@@ -100,6 +106,9 @@ def process_hh_type_county(hh_sizes_dicts, county_info_dict):
 def compile_wages(living_wage_df, hh_size_data):
     """
     Creates the best and worst case wage levels for each county and household type in IL.
+    The living wages (counties x family structures) are mapped to household
+    types with one matrix product for both scenarios and weighted by the
+    household type shares (counties x HH_TYPES).
     Inputs:
         - living_wage_df(pandas dataframe): dataframe that contains
                                             living wage for each county and household type.
@@ -109,30 +118,35 @@ def compile_wages(living_wage_df, hh_size_data):
            - wage_dict(nested dictionary): dictionary that maps
                                            each conty to best and worst case wages.
     """
-    wage_dict = {county:{} for county in living_wage_df["County"].unique()}
-    for county in wage_dict:
-        county_wage = living_wage_df[living_wage_df["County"] == county]
-        county_hhs = hh_size_data[hh_size_data["County"] == county]
-        wage_dict[county]["UB LW"] = gen_avg_wages(county_wage, county_hhs, UPPER_BOUND)
-        wage_dict[county]["LB LW"] = gen_avg_wages(county_wage, county_hhs, LOWER_BOUND)
-    return wage_dict
+    counties = living_wage_df["County"].unique()
+    wages = living_wage_df.pivot(index="County", columns="Family Structure",
+                                 values="Living Wage").loc[counties]
+    shares = hh_size_data.set_index("County").loc[counties, list(HH_TYPES)]
+
+    mapping = np.hstack([mapping_matrix(wages.columns, UPPER_BOUND),
+                         mapping_matrix(wages.columns, LOWER_BOUND)])
+    hh_type_wages = wages.to_numpy(dtype=float) @ mapping
+    avg_wages = hh_type_wages * np.tile(shares.to_numpy(dtype=float), 2)
+    avg_wages = avg_wages.reshape(len(counties), 2, len(HH_TYPES)).sum(axis=2).round(2)
+
+    return {county: {"UB LW": float(ub), "LB LW": float(lb)}
+            for county, (ub, lb) in zip(counties, avg_wages)}
 
 
-def gen_avg_wages(county_wage, count_hhs, mapping_dict):
+def mapping_matrix(family_structures, mapping_dict):
     """
-    Generates an average living wage for different types of families.
+    Builds the matrix that picks the family structure of each household type.
     Inputs:
-        -county_wage (pandas dataframe): county level living wage dataframe.
-        -county_hhs(pandas dataframe): county level household type dataframe.
+        -family_structures (list): family structures of the living wage data.
         -mapping_dict(dictionary): maps types of families to be aggregated based on the scenario.
     Returns:
-        -avg_wage(flot): the average wage.
+        -mapping(numpy array): family structures x HH_TYPES matrix of 0s and 1s.
     """
-    avg_wage = 0
-    for census_hh, lw_hh in mapping_dict.items():
-        row = county_wage[county_wage["Family Structure"] == lw_hh]
-        avg_wage += float(count_hhs[census_hh]) * float(row["Living Wage"])
-    return round(avg_wage, 2)
+    mapping = np.zeros((len(family_structures), len(HH_TYPES)))
+    family_structures = list(family_structures)
+    for j, census_hh in enumerate(HH_TYPES):
+        mapping[family_structures.index(mapping_dict[census_hh]), j] = 1
+    return mapping
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+"""
+Monte Carlo replicates of the unemployment draws
+
+gen_agg_data draws the households that lose their job once per county.
+Here the draw is repeated num_replicates times over the wage-independent
+hh-level store. The number of households drawn is fixed, so a replicate
+only changes whose hours are lost: each replicate's incomes are the
+income with no job losses minus the wage times the hours of the drawn
+households. Replicates are drawn in blocks of at most BLOCK_SIZE
+household draws, so memory does not grow with num_replicates.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import employment_model
+import gen_agg_data
+import hh_store
+
+#largest number of random keys (replicates x eligible hhs) drawn at once
+BLOCK_SIZE = 2**22
+PERCENTILES = (5, 95)
+
+#county-level columns that are summarized over the replicates
+MC_COLUMNS = ["New Wage Agg Income", "UB LW Agg Income", "LB LW Agg Income",
+              "% Below LB Living Wage at Inputted Min. Wage",
+              "% Below UB Living Wage at Inputted Min. Wage",
+              "Unemployed at New Wage", "Unemployed at UB LW", "Unemployed at LB LW"]
+
+
+def go(new_wage=15, num_replicates=200, percentiles=PERCENTILES,
+       filename="clean_data/master_data_mc.csv", clean_dir="clean_data",
+       model=employment_model.CBO):
+    '''
+    Runs the replicates for a new wage on the hh-level data with living
+    wage vars (see gen_agg_data.gen_lw_data) and summarizes them
+
+    Inputs:
+        - new_wage (int): proposed new federal minimum wage
+        - num_replicates (int): number of draws per county
+        - percentiles (tuple of floats): lower and upper band percentiles
+        - filename (string): filename to save the summary to
+        - clean_dir (string): directory of the clean data
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (DataFrame) one row per county with the mean and the
+                      percentile band of each column in MC_COLUMNS
+    '''
+    meta, hh_lw_arrays = hh_store.open_store(os.path.join(clean_dir, "hh_level_data_w_lw"))
+    fips = {col_meta["name"]: col_meta for col_meta in meta["columns"]}["FIP"]
+
+    rows = []
+    for county, (start, stop) in sorted(meta["county_index"].items()):
+        county_arrays = {col: values[start:stop] for col, values in hh_lw_arrays.items()}
+        county_fips = fips["dictionary"][county_arrays["FIP"][0]]
+        replicates = county_replicates(county_arrays, new_wage, num_replicates,
+                                       np.random.default_rng([gen_agg_data.SEED,
+                                                              int(county_fips)]),
+                                       model)
+
+        row = {"County": county, "FIP": county_fips, "Entered Wage": new_wage,
+               "Replicates": num_replicates}
+        for col in MC_COLUMNS:
+            low, high = np.percentile(replicates[col], percentiles)
+            row[col + " Mean"] = replicates[col].mean()
+            row[col + f" P{percentiles[0]:g}"] = low
+            row[col + f" P{percentiles[1]:g}"] = high
+        rows.append(row)
+
+    mc_df = pd.DataFrame(rows)
+    mc_df.to_csv(filename, index=False)
+
+    return mc_df
+
+
+def county_replicates(county_arrays, new_wage, num_replicates, rng,
+                      model=employment_model.CBO):
+    '''
+    Replicates the unemployment draws of one county
+
+    Inputs:
+        - county_arrays (dictionary): column name to array of the
+                                      county's hh-level data with living
+                                      wage vars
+        - new_wage (int): user-inputted minimum wage
+        - num_replicates (int): number of draws
+        - rng (np.random.Generator): random generator of the county
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (dictionary) column in MC_COLUMNS to array with one value per
+                       replicate
+    '''
+    hourly_wage = np.asarray(county_arrays["Hourly Wage"])
+    hours = np.asarray(county_arrays["Hours"])
+    num_hhs = len(hourly_wage)
+    county_size = county_arrays["County Size"][0]
+
+    #employment model, with the counts gen_agg_data uses
+    wages = {"New Wage": new_wage,
+             "UB LW": county_arrays["County UB LW"][0],
+             "LB LW": county_arrays["County LB LW"][0]}
+    num_unemp = {"New Wage": int(employment_model.unemp_rate(new_wage, model) * num_hhs)}
+    for bound in ["UB LW", "LB LW"]:
+        num_unemp[bound] = int(np.trunc(employment_model.unemp_rate(wages[bound], model) *
+                                        county_size))
+
+    replicates = {}
+    for wage_col, wage in wages.items():
+        eligible_hours = hours[hourly_wage <= wage]
+        num_unemp[wage_col] = min(max(num_unemp[wage_col], 0), len(eligible_hours))
+        full_income = (np.maximum(hourly_wage, wage) * hours * 52.14).sum()
+        lost_hours = sum_drawn(eligible_hours, num_unemp[wage_col], num_replicates, rng)
+        replicates[wage_col + " Agg Income"] = full_income - wage * lost_hours * 52.14
+        replicates["Unemployed at " + wage_col] = np.full(num_replicates,
+                                                          num_unemp[wage_col] / num_hhs)
+
+    #a hh ends up at or below the LW if it stays at or below it after the
+    #new wage, or if it loses its job
+    new_wage_col = np.maximum(hourly_wage, new_wage)
+    for bound in ["LB", "UB"]:
+        lw = wages[bound + " LW"]
+        num_below = (new_wage_col <= lw).sum() + (num_unemp["New Wage"] if new_wage > lw else 0)
+        replicates[f"% Below {bound} Living Wage at Inputted Min. Wage"] = np.full(
+            num_replicates, num_below / num_hhs)
+
+    return replicates
+
+
+def sum_drawn(values, num_drawn, num_replicates, rng):
+    '''
+    Sums the values of a random subset of num_drawn of them (drawn
+    without replacement) in each replicate, a block of replicates at a
+    time
+
+    Inputs:
+        - values (array): values to draw from
+        - num_drawn (int): size of each subset
+        - num_replicates (int): number of subsets
+        - rng (np.random.Generator): random generator
+    Outputs:
+        - (array) sum of each subset
+    '''
+    sums = np.zeros(num_replicates)
+    if num_drawn == 0:
+        return sums
+    if num_drawn == len(values):
+        return sums + values.sum()
+
+    block = max(1, BLOCK_SIZE // len(values))
+    for first in range(0, num_replicates, block):
+        keys = rng.random((min(block, num_replicates - first), len(values)))
+        drawn = np.argpartition(keys, num_drawn - 1, axis=1)[:, :num_drawn]
+        sums[first:first + len(keys)] = values[drawn].sum(axis=1)
+    return sums
+
+
+if __name__ == "__main__":
+    usage = "python3 gen_mc_data.py <wage> [replicates]"
+    new_wage = int(sys.argv[1])
+    num_replicates = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    go(new_wage, num_replicates)
@@ -6,82 +6,66 @@ import plotly
 import pandas as pd
 import numpy as np
 import json
+import os
 import plotly.express as px
 import plotly.graph_objects as go
 from urllib.request import urlopen
 import sys
+import instrument
 
+GEOJSON_URL = ('https://raw.githubusercontent.com/plotly/' +
+               'datasets/master/geojson-counties-fips.json')
+GEOJSON_FILE = 'raw_data/geojson-counties-fips.json'
+# grid (in degrees) the county outlines are snapped to, ~100m
+GEOJSON_TOLERANCE = 0.001
+# wage floor of the model (gen_hh_level_data), shown as the current minimum
+CURRENT_MIN_WAGE = 10
 
-def gen_visuals(df_master, counties):
+
+def county_labels(df_master):
     '''
-    Creates plotly objects representing the graphs and maps that the user
-    will select.
+    Bar chart labels of the counties. County names repeat across states,
+    so national master data (which has a State column) gets the state added.
     Inputs:
-        Link(str): the link that contains county level data.
+        df_master(pandas dataframe): county level master data.
     Returns:
-        df(pandas dataframe): dataframe for county level wage data.
+        pandas series of labels.
     '''
+    if 'State' in df_master:
+        return df_master['County'] + ', ' + df_master['State']
+    return df_master['County']
 
-    below_lb_lw_at_new = px.choropleth(df_master, geojson=counties,
-        locations='FIP', color='% Below LB Living Wage at Inputted Min. Wage',
-        color_continuous_scale="Tealgrn",
-        range_color=(
-            np.min(df_master['% Below LB Living Wage at Inputted Min. Wage']),
-            np.max(df_master['% Below LB Living Wage at Inputted Min. Wage'])),
-        scope="usa",
-        hover_name='County',
-        labels={
-            '% Below LB Living Wage at Inputted Min. Wage':
-            '% Below LB Living Wage at Inputted Min. Wage'})
-    below_lb_lw_at_new.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
-    below_lb_lw_at_new.update_geos(fitbounds="locations", visible=False)
-    below_lb_lw_at_new.update_layout(
-        title_text='<br>Effectiveness of New Wage Relative to Conservative ' +
-                    'Living Wage<br>(Percentage of Working Houeholds ' +
-                    'Below the Lower Bound Living Wage Given Minimum Wage ' +
-                    'of $' + str(df_master['Entered Wage'][0]) +')')
-
-    effected_by_new_wage = px.choropleth(df_master, geojson=counties,
-        locations='FIP',
-        color='% Affected by New Wage',
-        color_continuous_scale="Sunsetdark",
-        range_color=(
-            np.min(
-                df_master['% Affected by New Wage']),
-            np.max(
-                df_master['% Affected by New Wage'])),
-        scope="usa",
-        hover_name='County',
-        labels={
-            '% Affected by New Wage': '% Affected by New Wage'})
-    effected_by_new_wage.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
-    effected_by_new_wage.update_geos(fitbounds="locations", visible=False)
-    effected_by_new_wage.update_layout(
-        title_text='<br>Percentage of Working Households Affected ' +
-                    'by the User Inputted Wage of $' + 
-                    str(df_master['Entered Wage'][0]))
 
+def gen_wage_comparison(df_master):
+    '''
+    Creates the bar chart of current, entered and living wages.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+    Returns:
+        plotly figure.
+    '''
+    labels = county_labels(df_master)
     wage_comparison = go.Figure()
     wage_comparison.add_trace(go.Bar(
-        x=df_master['County'],
-        y=[10] * 102,
+        x=labels,
+        y=[CURRENT_MIN_WAGE] * len(df_master),
         name='Current Minimum Wage',
         marker_color='indianred'
     ))
     wage_comparison.add_trace(go.Bar(
-        x=df_master['County'],
+        x=labels,
         y=df_master['Entered Wage'],
         name='Wage User Entered',
         marker_color='lightsalmon'
     ))
     wage_comparison.add_trace(go.Bar(
-        x=df_master['County'],
+        x=labels,
         y=df_master['County UB LW'],
         name='County Upper Bound Living Wage',
         marker_color='blue'
     ))
     wage_comparison.add_trace(go.Bar(
-        x=df_master['County'],
+        x=labels,
         y=df_master['County LB LW'],
         name='County Lower Bound Living Wage',
         marker_color='green'
@@ -89,31 +73,83 @@ def gen_visuals(df_master, counties):
     wage_comparison.update_layout(title_text='<br>Wage Comparisons')
     wage_comparison.update_layout(barmode='group', xaxis_tickangle=-45)
 
-    unem_comparison = go.Figure()
-    unem_comparison.add_trace(go.Bar(
-        x=df_master['County'],
-        y=df_master['Unemployed at LB LW'],
-        name='Unemployed at Conservative Estimate of Living Wage',
-        marker_color='red'
-    ))
-    unem_comparison.add_trace(go.Bar(
-        x=df_master['County'],
-        y=df_master['Unemployed at UB LW'],
-        name='Unemployed at Generous Estimate of Living Wage',
-        marker_color='blue'
-    ))
-    unem_comparison.add_trace(go.Bar(
-        x=df_master['County'],
-        y=df_master['Unemployed at New Wage'],
-        name='Unemployed at User Inputted Wage of $' + 
-             str(df_master['Entered Wage'][0]),
-        marker_color='green'
-    ))
-    unem_comparison.update_layout(
-        title_text='<br>Unemployment Repercussions<br>(Percentage ' + 
-                    'Point Change in Unemployment Relative to 2019)')
-    unem_comparison.update_layout(barmode='group', xaxis_tickangle=-45)
+    return wage_comparison
 
+
+def gen_effected_by_new_wage(df_master, counties):
+    '''
+    Creates the map of the share of households affected by the new wage.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+        counties(dict): GeoJSON of the counties.
+    Returns:
+        plotly figure.
+    '''
+    effected_by_new_wage = px.choropleth(df_master, geojson=counties,
+        locations='FIP',
+        color='% Affected by New Wage',
+        color_continuous_scale="Sunsetdark",
+        range_color=(
+            np.min(
+                df_master['% Affected by New Wage']),
+            np.max(
+                df_master['% Affected by New Wage'])),
+        scope="usa",
+        hover_name='County',
+        labels={
+            '% Affected by New Wage': '% Affected by New Wage'})
+    effected_by_new_wage.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
+    effected_by_new_wage.update_geos(fitbounds="locations", visible=False)
+    effected_by_new_wage.update_layout(
+        title_text='<br>Percentage of Working Households Affected ' +
+                    'by the User Inputted Wage of $' + 
+                    str(df_master['Entered Wage'][0]))
+
+    return effected_by_new_wage
+
+
+def gen_below_lb_lw_at_new(df_master, counties):
+    '''
+    Creates the map of the share of households below the conservative
+    living wage at the new wage.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+        counties(dict): GeoJSON of the counties.
+    Returns:
+        plotly figure.
+    '''
+    below_lb_lw_at_new = px.choropleth(df_master, geojson=counties,
+        locations='FIP', color='% Below LB Living Wage at Inputted Min. Wage',
+        color_continuous_scale="Tealgrn",
+        range_color=(
+            np.min(df_master['% Below LB Living Wage at Inputted Min. Wage']),
+            np.max(df_master['% Below LB Living Wage at Inputted Min. Wage'])),
+        scope="usa",
+        hover_name='County',
+        labels={
+            '% Below LB Living Wage at Inputted Min. Wage':
+            '% Below LB Living Wage at Inputted Min. Wage'})
+    below_lb_lw_at_new.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
+    below_lb_lw_at_new.update_geos(fitbounds="locations", visible=False)
+    below_lb_lw_at_new.update_layout(
+        title_text='<br>Effectiveness of New Wage Relative to Conservative ' +
+                    'Living Wage<br>(Percentage of Working Houeholds ' +
+                    'Below the Lower Bound Living Wage Given Minimum Wage ' +
+                    'of $' + str(df_master['Entered Wage'][0]) +')')
+
+    return below_lb_lw_at_new
+
+
+def gen_lb_lw_from_EW(df_master, counties):
+    '''
+    Creates the map of the difference between the conservative living wage
+    and the new wage.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+        counties(dict): GeoJSON of the counties.
+    Returns:
+        plotly figure.
+    '''
     lb_lw_from_EW = px.choropleth(
         df_master,
         geojson=counties,
@@ -135,6 +171,19 @@ def gen_visuals(df_master, counties):
                     'Living Wage and User Inputted Wage of $' +
                     str(df_master['Entered Wage'][0]) + ' (USD)')
 
+    return lb_lw_from_EW
+
+
+def gen_ub_lw_from_EW(df_master, counties):
+    '''
+    Creates the map of the difference between the generous living wage
+    and the new wage.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+        counties(dict): GeoJSON of the counties.
+    Returns:
+        plotly figure.
+    '''
     ub_lw_from_EW = px.choropleth(
         df_master,
         geojson=counties,
@@ -156,14 +205,203 @@ def gen_visuals(df_master, counties):
                     'Living Wage and Use Inputted Wage of $' +
                     str(df_master['Entered Wage'][0]) + ' (USD')
 
-    return (wage_comparison, effected_by_new_wage, below_lb_lw_at_new,
-             lb_lw_from_EW, ub_lw_from_EW, unem_comparison)
+    return ub_lw_from_EW
+
+
+def gen_unem_comparison(df_master):
+    '''
+    Creates the bar chart of unemployment at the new and living wages.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+    Returns:
+        plotly figure.
+    '''
+    labels = county_labels(df_master)
+    unem_comparison = go.Figure()
+    unem_comparison.add_trace(go.Bar(
+        x=labels,
+        y=df_master['Unemployed at LB LW'],
+        name='Unemployed at Conservative Estimate of Living Wage',
+        marker_color='red'
+    ))
+    unem_comparison.add_trace(go.Bar(
+        x=labels,
+        y=df_master['Unemployed at UB LW'],
+        name='Unemployed at Generous Estimate of Living Wage',
+        marker_color='blue'
+    ))
+    unem_comparison.add_trace(go.Bar(
+        x=labels,
+        y=df_master['Unemployed at New Wage'],
+        name='Unemployed at User Inputted Wage of $' + 
+             str(df_master['Entered Wage'][0]),
+        marker_color='green'
+    ))
+    unem_comparison.update_layout(
+        title_text='<br>Unemployment Repercussions<br>(Percentage ' + 
+                    'Point Change in Unemployment Relative to 2019)')
+    unem_comparison.update_layout(barmode='group', xaxis_tickangle=-45)
+
+    return unem_comparison
+
+
+def gen_visuals(df_master, counties):
+    '''
+    Creates plotly objects representing the graphs and maps that the user
+    will select.
+    Inputs:
+        df_master(pandas dataframe): county level master data.
+        counties(dict): GeoJSON of the counties.
+    Returns:
+        tuple of the six plotly figures, in map menu order.
+    '''
+    return (gen_wage_comparison(df_master),
+            gen_effected_by_new_wage(df_master, counties),
+            gen_below_lb_lw_at_new(df_master, counties),
+            gen_lb_lw_from_EW(df_master, counties),
+            gen_ub_lw_from_EW(df_master, counties),
+            gen_unem_comparison(df_master))
+
+
+#map menu option -> function building the figure, whether it is a map
+FIGURES = {1: (gen_wage_comparison, False),
+           2: (gen_effected_by_new_wage, True),
+           3: (gen_below_lb_lw_at_new, True),
+           4: (gen_lb_lw_from_EW, True),
+           5: (gen_ub_lw_from_EW, True),
+           6: (gen_unem_comparison, False)}
+
+#data and figures built so far for the current wage
+SESSION = {"wage": None, "file_name": None, "df_master": None,
+           "counties": None, "figures": {}}
+
+
+@instrument.stage("plotting")
+def get_figure(option, wage, file_name='clean_data/master_data.csv'):
+    '''
+    Builds only the figure for a map menu option. Figures (and the data
+    they are built from) are kept for the rest of the session and rebuilt
+    once the wage changes. County outlines do not depend on the wage and
+    are kept across wages.
+    Inputs:
+        option(int): map menu option, 1 to 6.
+        wage(int): the wage the master data was generated for.
+        file_name(str): master data file.
+    Returns:
+        plotly figure.
+    '''
+    if file_name != SESSION["file_name"]:
+        SESSION.update(file_name=file_name, wage=wage, df_master=None,
+                       counties=None, figures={})
+    elif wage != SESSION["wage"]:
+        SESSION.update(wage=wage, df_master=None, figures={})
+
+    if option not in SESSION["figures"]:
+        if SESSION["df_master"] is None:
+            SESSION["df_master"] = read_master(file_name)
+        gen_figure, is_map = FIGURES[option]
+        if is_map:
+            if SESSION["counties"] is None:
+                SESSION["counties"] = load_counties(SESSION["df_master"]['FIP'])
+            figure = gen_figure(SESSION["df_master"], SESSION["counties"])
+        else:
+            figure = gen_figure(SESSION["df_master"])
+        SESSION["figures"][option] = figure
+
+    return SESSION["figures"][option]
+
+
+def read_master(file_name):
+    '''
+    Reads the master data with the FIPS codes as 5 digit strings, the
+    ids of the GeoJSON counties (read as numbers, 01001 would be 1001).
+    Inputs:
+        file_name(str): the master data csv.
+    Returns:
+        df_master(pandas dataframe): the master data.
+    '''
+    df_master = pd.read_csv(file_name, dtype={'FIP': str})
+    df_master['FIP'] = df_master['FIP'].str.zfill(5)
+    return df_master
+
+
+def load_counties(fips, tolerance=GEOJSON_TOLERANCE, file_name=GEOJSON_FILE):
+    '''
+    Loads the county outlines for the given FIPS codes. The national
+    GeoJSON file is downloaded on first use and read from disk after that.
+    Inputs:
+        fips(iterable): FIPS codes of the counties to keep.
+        tolerance(float): grid in degrees to snap the coordinates to,
+            dropping points that collapse together (None keeps them all).
+        file_name(str): where the national file is cached.
+    Returns:
+        counties(dict): GeoJSON FeatureCollection of the counties.
+    '''
+    if not os.path.exists(file_name):
+        with urlopen(GEOJSON_URL) as response:
+            data = response.read()
+        # written under another name first, so an interrupted download
+        # never leaves a truncated file at file_name
+        with open(file_name + '.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(file_name + '.tmp', file_name)
+
+    with open(file_name, 'r') as file:
+        counties = json.load(file)
+
+    fips = {str(fip).zfill(5) for fip in fips}
+    features = [feature for feature in counties['features']
+                if feature['id'] in fips]
+    if tolerance is not None:
+        features = [simplify_feature(feature, tolerance) for feature in features]
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def simplify_feature(feature, tolerance):
+    '''
+    Snaps the coordinates of a county outline to a grid. Neighboring
+    counties snap their shared borders to the same points, so no gaps open.
+    Inputs:
+        feature(dict): GeoJSON Polygon or MultiPolygon feature.
+        tolerance(float): grid size in degrees.
+    Returns:
+        feature(dict): the simplified feature.
+    '''
+    geometry = feature['geometry']
+    if geometry['type'] == 'Polygon':
+        coordinates = [simplify_ring(ring, tolerance)
+                       for ring in geometry['coordinates']]
+    else:
+        coordinates = [[simplify_ring(ring, tolerance) for ring in polygon]
+                       for polygon in geometry['coordinates']]
+
+    return dict(feature, geometry={'type': geometry['type'],
+                                   'coordinates': coordinates})
+
+
+def simplify_ring(ring, tolerance):
+    '''
+    Snaps the points of a closed ring to a grid and removes consecutive
+    duplicates. Rings that would collapse are returned unchanged.
+    Inputs:
+        ring(list): [lon, lat] points, first and last equal.
+        tolerance(float): grid size in degrees.
+    Returns:
+        ring(list): the simplified ring.
+    '''
+    decimals = max(0, int(-np.floor(np.log10(tolerance))))
+    points = np.round(np.round(np.array(ring) / tolerance) * tolerance, decimals)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (np.diff(points, axis=0) != 0).any(axis=1)
+    points = points[keep]
+    if len(points) < 4:
+        return ring
+    return points.tolist()
 
 
-def _go(file_name='clean_data/master_data.csv'):
+def _go(file_name='clean_data/master_data.csv', tolerance=GEOJSON_TOLERANCE):
 
-    with urlopen('https://raw.githubusercontent.com/plotly/' + 
-                'datasets/master/geojson-counties-fips.json') as response:
-        counties = json.load(response)
-    df_master = pd.read_csv(file_name)
+    df_master = read_master(file_name)
+    counties = load_counties(df_master['FIP'], tolerance)
     return gen_visuals(df_master, counties)
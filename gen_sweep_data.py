@@ -0,0 +1,79 @@
+"""
+Sensitivity sweep over the coefficients of the employment model
+
+Evaluates every model in a grid (see employment_model.grid) at every wage
+in one pass over the hh-level store. The wage-independent arrays of a
+county are read once and reused for all grid points: the living wage job
+losses are drawn once per model and the new wage ones once per model and
+wage. The result is a tidy table with one row per county, model and wage
+and the columns of gen_agg_data.agg_data.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import employment_model
+import gen_agg_data
+import hh_store
+
+#hh-level columns the sweep reads, the others are model dependent
+INPUT_COLUMNS = ["Hourly Wage", "Hours", "Current Agg Income", "County Size",
+                 "County UB LW", "County LB LW"]
+
+
+def go(wages=(15,), models=(employment_model.CBO,),
+       filename="clean_data/sweep_data.csv", clean_dir="clean_data"):
+    '''
+    Runs the model for every combination of employment model and wage
+
+    Inputs:
+        - wages (list of ints): proposed new federal minimum wages
+        - models (list of dictionaries): employment model coefficients
+        - filename (string): filename to save the table to
+        - clean_dir (string): directory of the clean data
+    Outputs:
+        - (DataFrame) one row per county, model and wage, with the
+                      model coefficients and the agg_data columns
+    '''
+    meta, hh_lw_arrays = hh_store.open_store(os.path.join(clean_dir, "hh_level_data_w_lw"))
+    fips = {col_meta["name"]: col_meta for col_meta in meta["columns"]}["FIP"]
+
+    rows = []
+    for county, (start, stop) in sorted(meta["county_index"].items()):
+        county_arrays = {col: np.asarray(hh_lw_arrays[col][start:stop])
+                         for col in INPUT_COLUMNS}
+        county_fips = fips["dictionary"][hh_lw_arrays["FIP"][start]]
+        seed = gen_agg_data.county_seed(county_fips)
+        county_row = {"County": county,
+                      "FIP": county_fips,
+                      "County Size": county_arrays["County Size"][0],
+                      "County UB LW": county_arrays["County UB LW"][0],
+                      "County LB LW": county_arrays["County LB LW"][0],
+                      "Current Agg Income": county_arrays["Current Agg Income"].sum()}
+
+        for model in models:
+            lw_vars = gen_agg_data.county_lw_vars(county_arrays, seed, model)
+            for new_wage in wages:
+                row = dict(county_row, **model)
+                row["Entered Wage"] = new_wage
+                row.update(lw_vars)
+                row.update(gen_agg_data.county_new_wage_vars(county_arrays, seed,
+                                                             new_wage, model))
+                rows.append(row)
+
+    sweep_df = pd.DataFrame(rows)
+    sweep_df = sweep_df[employment_model.COEFFICIENTS + gen_agg_data.AGG_COLUMNS]
+    sweep_df = gen_agg_data.gen_new_vars(sweep_df)
+    sweep_df.to_csv(filename, index=False)
+
+    return sweep_df
+
+
+if __name__ == "__main__":
+    usage = "python3 gen_sweep_data.py <wage,...> [slope,...] [intercept,...] [scale,...]"
+    wages = [int(wage) for wage in sys.argv[1].split(",")]
+    coefficients = {}
+    for name, arg in zip(employment_model.COEFFICIENTS, sys.argv[2:]):
+        coefficients[name + "s"] = [float(value) for value in arg.split(",")]
+    go(wages, employment_model.grid(**coefficients))
@@ -0,0 +1,420 @@
+"""
+Binary columnar storage for the household-level datasets
+
+A store is a directory with one .npy file per column and a meta.json
+describing the columns. County, Bins and FIP are dictionary-encoded
+(small integer codes plus the list of distinct values), and rows are
+grouped by county so meta.json can map each county to its row range.
+Loading one county or a few columns only reads those parts of the files.
+meta.json also records a content hash of the data, so it can be
+identified without reading it.
+
+replace_counties rewrites the rows of some counties by appending them
+to the column files and pointing their row ranges there, so the cost
+is set by those counties. The rows they replace stay in the files
+until they outnumber the live ones, then the store is compacted.
+
+Rewriting a store never changes the files it was made of: the columns
+are written to new files and meta.json is switched over to them before
+the old ones are deleted, so readers that have the old files open (the
+memory maps of open_store) keep reading the old data.
+"""
+
+import hashlib
+import io
+import json
+import os
+import numpy as np
+import pandas as pd
+import instrument
+from scenario_cache import hash_files
+
+FORMATS = ["store", "csv"]
+DICT_COLUMNS = ["County", "Bins", "FIP"]
+META_FILE = "meta.json"
+MODEL_SUFFIX = ".model.json"
+
+
+@instrument.stage("store_write")
+def save(df, filename, file_format="store", model=None):
+    '''
+    Saves a household-level dataset
+
+    Inputs:
+        - df (DataFrame): hh-level data
+        - filename (string): path without extension
+        - file_format (string): "store" for a binary columnar store or
+                                "csv" for filename + ".csv"
+        - model (dictionary): employment model the data was computed
+                              with, if any (see stored_model)
+    '''
+    assert file_format in FORMATS, f"file_format must be one of {FORMATS}"
+    if file_format == "csv":
+        df.to_csv(filename + ".csv", index = False)
+        if model is not None:
+            with open(filename + MODEL_SUFFIX, "w") as file:
+                json.dump(model, file)
+    else:
+        write_store(df, filename, model)
+
+
+def stored_model(filename, file_format="store"):
+    '''
+    Employment model a household-level dataset was computed with, kept
+    in meta.json for a store and next to the file for a csv
+
+    Inputs:
+        - filename (string): path without extension
+        - file_format (string): "store" or "csv" (see save)
+    Outputs:
+        - (dictionary) model coefficients, None if none was recorded
+    '''
+    if file_format == "store":
+        return read_meta(filename).get("model")
+    try:
+        with open(filename + MODEL_SUFFIX, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+@instrument.stage("store_read")
+def load(filename, file_format="store", columns=None, counties=None):
+    '''
+    Loads a household-level dataset
+
+    Inputs:
+        - filename (string): path without extension
+        - file_format (string): "store" or "csv" (see save)
+        - columns (list of strings): columns to load (all if None)
+        - counties (list of strings): counties to load (all if None)
+    Outputs:
+        - (DataFrame) hh-level data
+    '''
+    assert file_format in FORMATS, f"file_format must be one of {FORMATS}"
+    if file_format == "store":
+        return read_store(filename, columns, counties)
+
+    df = pd.read_csv(filename + ".csv", usecols=columns, dtype={"FIP": str})
+    if counties is not None:
+        df = df[df["County"].isin(counties)].reset_index(drop=True)
+    return df
+
+
+def write_store(df, path, model=None):
+    '''
+    Writes a DataFrame to a binary columnar store. Rows are stably
+    grouped by county (which leaves data already grouped unchanged).
+
+    Inputs:
+        - df (DataFrame): hh-level data with a County column
+        - path (string): directory to write the store to
+        - model (dictionary): employment model to record, if any
+    '''
+    county_codes, county_names = pd.factorize(df["County"])
+    order = np.argsort(county_codes, kind="stable")
+    if (np.diff(order) != 1).any():
+        df = df.iloc[order].reset_index(drop=True)
+        county_codes = county_codes[order]
+    bounds = np.searchsorted(county_codes, np.arange(len(county_names) + 1))
+
+    os.makedirs(path, exist_ok=True)
+    try:
+        generation = read_meta(path).get("generation", 0) + 1
+    except (OSError, ValueError):
+        generation = 0
+    meta = {"num_rows": len(df),
+            "generation": generation,
+            "columns": [],
+            "county_index": {county: [int(bounds[i]), int(bounds[i + 1])]
+                             for i, county in enumerate(county_names)}}
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        col_meta = {"name": col, "file": f"col_{i:02d}.{generation}.npy"}
+        if col in DICT_COLUMNS:
+            codes, uniques = pd.factorize(df[col])
+            values = codes.astype(np.int16 if len(uniques) < 2**15 else np.int32)
+            col_meta["dictionary"] = uniques.tolist()
+        else:
+            values = df[col].values
+        col_meta["dtype"] = values.dtype.str
+        np.save(os.path.join(path, col_meta["file"]), values)
+        meta["columns"].append(col_meta)
+        columns.append(values)
+
+    meta["county_digests"] = {county: county_digest(columns, start, stop)
+                              for county, (start, stop) in meta["county_index"].items()}
+    if model is not None:
+        meta["model"] = model
+    meta["digest"] = store_digest(meta)
+    write_meta(meta, path)
+
+    files = {col_meta["file"] for col_meta in meta["columns"]}
+    for filename in os.listdir(path):
+        if filename.endswith(".npy") and filename not in files:
+            os.remove(os.path.join(path, filename))
+
+
+def county_digest(columns, start, stop):
+    '''
+    Hash of the rows of a county in every column.
+
+    Inputs:
+        - columns (list of arrays): stored values of each column
+        - start, stop (int): row range of the county
+    Outputs:
+        - (string) hex digest
+    '''
+    digest = hashlib.sha256()
+    for values in columns:
+        digest.update(np.ascontiguousarray(values[start:stop]))
+    return digest.hexdigest()
+
+
+def store_digest(meta):
+    '''
+    Content hash of a store, from its columns and the hashes of its
+    counties, so updating a county does not rehash the others. The file
+    names change with every rewrite and are left out.
+    '''
+    columns = [{key: value for key, value in col_meta.items() if key != "file"}
+               for col_meta in meta["columns"]]
+    digest = hashlib.sha256(json.dumps(columns).encode())
+    for county in sorted(meta["county_digests"]):
+        digest.update(json.dumps([county, meta["county_digests"][county]]).encode())
+    return digest.hexdigest()
+
+
+def write_meta(meta, path):
+    '''
+    Writes meta.json, through a temporary file so readers never see a
+    partly written one.
+    '''
+    tmp_file = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_file, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp_file, os.path.join(path, META_FILE))
+
+
+@instrument.stage("store_write")
+def replace_counties(df, filename, file_format="store", removed=(), model=None):
+    '''
+    Replaces the rows of the counties in df (adding counties that are
+    not there yet) and drops the removed counties
+
+    Inputs:
+        - df (DataFrame): hh-level data of the counties to write, with
+                          the columns of the stored data, None to only
+                          drop counties
+        - filename (string): path without extension
+        - file_format (string): "store" or "csv" (see save). A csv file
+                                is rewritten as a whole
+        - removed (list of strings): counties to drop
+        - model (dictionary): employment model df was computed with, if
+                              any. It has to be the one of the other
+                              counties, which update_counties ensures
+                              by recomputing every county for a new model
+    '''
+    assert file_format in FORMATS, f"file_format must be one of {FORMATS}"
+    counties = set(removed)
+    if df is not None:
+        counties |= set(df["County"].astype(str))
+    if file_format == "csv" or not append_counties(df, filename, counties, model):
+        old_df = load(filename, file_format)
+        old_df = old_df[~old_df["County"].astype(str).isin(counties)]
+        if df is not None:
+            old_df = pd.concat([old_df, df[old_df.columns]], ignore_index=True)
+        save(old_df, filename, file_format, model)
+
+
+def append_counties(df, path, counties, model=None):
+    '''
+    Appends the rows of df to the columns of a store and points the row
+    ranges of its counties there. The rows of the other counties in
+    counties are dropped from the row index.
+
+    Inputs:
+        - df (DataFrame): hh-level data of the counties to write, or None
+        - path (string): directory of the store
+        - counties (set of strings): counties whose old rows are dropped
+        - model (dictionary): employment model to record, if any
+    Outputs:
+        - (boolean) False if the store has to be rewritten instead: it
+                    was written without county hashes, has other
+                    columns, would be mostly dropped rows afterwards or
+                    its dictionaries outgrow their integer type
+    '''
+    meta = read_meta(path)
+    if df is None:
+        df = pd.DataFrame({col_meta["name"]: pd.Series(dtype=col_meta["dtype"])
+                           for col_meta in meta["columns"]})
+    if ("county_digests" not in meta or
+            [col_meta["name"] for col_meta in meta["columns"]] != list(df.columns)):
+        return False
+
+    county_index = {county: rows for county, rows in meta["county_index"].items()
+                    if county not in counties}
+    live_rows = sum(stop - start for start, stop in county_index.values()) + len(df)
+    if meta["num_rows"] + len(df) > 2 * live_rows:
+        return False
+
+    county_codes, county_names = pd.factorize(df["County"].astype(str))
+    order = np.argsort(county_codes, kind="stable")
+    df = df.iloc[order].reset_index(drop=True)
+    bounds = np.searchsorted(county_codes[order], np.arange(len(county_names) + 1))
+
+    columns = []
+    for col_meta in meta["columns"]:
+        values = df[col_meta["name"]]
+        if "dictionary" in col_meta:
+            dictionary = col_meta["dictionary"] + [value for value in
+                                                   pd.unique(values.astype(str))
+                                                   if value not in col_meta["dictionary"]]
+            if len(dictionary) > np.iinfo(col_meta["dtype"]).max + 1:
+                return False
+            col_meta["dictionary"] = dictionary
+            values = pd.Index(dictionary).get_indexer(values.astype(str))
+        values = np.asarray(values, dtype=col_meta["dtype"])
+        columns.append(values)
+
+    start = meta["num_rows"]
+    for col_meta, values in zip(meta["columns"], columns):
+        if not append_npy(os.path.join(path, col_meta["file"]), values, start):
+            return False
+
+    for county in counties:
+        meta["county_digests"].pop(county, None)
+    for i, county in enumerate(county_names):
+        county_index[county] = [start + int(bounds[i]), start + int(bounds[i + 1])]
+        meta["county_digests"][county] = county_digest(columns, bounds[i], bounds[i + 1])
+    meta["county_index"] = county_index
+    meta["num_rows"] = start + len(df)
+    if model is not None:
+        meta["model"] = model
+    meta["digest"] = store_digest(meta)
+    write_meta(meta, path)
+    return True
+
+
+def append_npy(filename, values, num_rows):
+    '''
+    Appends values to a one-dimensional .npy file in place. np.save
+    leaves room in the header for the length to grow.
+
+    Inputs:
+        - filename (string): .npy file
+        - values (array): values of the same dtype
+        - num_rows (int): rows of the file to keep, rows after them
+                          (left by an interrupted append) are overwritten
+    Outputs:
+        - (boolean) False if the header cannot hold the new length
+    '''
+    with open(filename, "r+b") as file:
+        version = np.lib.format.read_magic(file)
+        read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                       else np.lib.format.read_array_header_2_0)
+        write_header = (np.lib.format.write_array_header_1_0 if version == (1, 0)
+                        else np.lib.format.write_array_header_2_0)
+        _, _, dtype = read_header(file)
+        header_size = file.tell()
+
+        header = io.BytesIO()
+        write_header(header, {"descr": np.lib.format.dtype_to_descr(dtype),
+                              "fortran_order": False,
+                              "shape": (num_rows + len(values),)})
+        if len(header.getvalue()) != header_size:
+            return False
+
+        file.seek(header_size + num_rows * dtype.itemsize)
+        file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        file.truncate()
+        file.seek(0)
+        file.write(header.getvalue())
+    return True
+
+
+def digest(filename, file_format="store"):
+    '''
+    Content hash of a household-level dataset. Stores record it when
+    written; csv files (and stores written without it) are hashed.
+
+    Inputs:
+        - filename (string): path without extension
+        - file_format (string): "store" or "csv" (see save)
+    Outputs:
+        - (string) hex digest
+    '''
+    if file_format == "csv":
+        return hash_files([filename + ".csv"])
+
+    meta = read_meta(filename)
+    if "digest" in meta:
+        return meta["digest"]
+    return hash_files([os.path.join(filename, col_meta["file"])
+                       for col_meta in meta["columns"]])
+
+
+def read_meta(path):
+    '''
+    Reads the description of a binary columnar store
+
+    Inputs:
+        - path (string): directory of the store
+    Outputs:
+        - (dictionary) number of rows, columns and county row ranges
+    '''
+    with open(os.path.join(path, META_FILE), "r") as file:
+        return json.load(file)
+
+
+def open_store(path):
+    '''
+    Opens every column of a store as a read-only memory map, so values
+    are paged in from disk (and shared between processes through the
+    page cache) only when they are used. Dictionary-encoded columns are
+    left as their integer codes.
+
+    Inputs:
+        - path (string): directory of the store
+    Outputs:
+        - (tuple) meta dictionary (see read_meta), dictionary mapping
+                  column name to np.memmap
+    '''
+    meta = read_meta(path)
+    arrays = {col_meta["name"]: np.load(os.path.join(path, col_meta["file"]),
+                                        mmap_mode="r")
+              for col_meta in meta["columns"]}
+    return meta, arrays
+
+
+def read_store(path, columns=None, counties=None):
+    '''
+    Reads a binary columnar store into a DataFrame
+
+    Inputs:
+        - path (string): directory of the store
+        - columns (list of strings): columns to load (all if None)
+        - counties (list of strings): counties to load (all if None)
+    Outputs:
+        - (DataFrame) hh-level data, in stored row order
+    '''
+    meta = read_meta(path)
+    if counties is None:
+        #the rows of every county, leaving out rows replaced by
+        #replace_counties
+        ranges = sorted(meta["county_index"].values())
+    else:
+        ranges = [meta["county_index"][county] for county in counties]
+
+    data = {}
+    for col_meta in meta["columns"]:
+        if columns is not None and col_meta["name"] not in columns:
+            continue
+        values = np.load(os.path.join(path, col_meta["file"]), mmap_mode="r")
+        values = np.concatenate([values[start:stop] for start, stop in ranges])
+        if "dictionary" in col_meta:
+            values = pd.Index(col_meta["dictionary"]).take(values).values
+        data[col_meta["name"]] = values
+
+    return pd.DataFrame(data)
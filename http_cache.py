@@ -0,0 +1,174 @@
+'''
+On-disk HTTP response cache with conditional revalidation
+
+Responses are stored with their ETag and Last-Modified headers. In
+"revalidate" mode every cached page is revalidated with If-None-Match /
+If-Modified-Since, so an unchanged page costs one 304, and the cached
+page is also used when the server errors or cannot be reached. "fresh"
+mode does the same but uses a page fetched less than FRESH_FOR seconds
+ago without any request. In "replay" mode only the cache is used and
+nothing goes to the network. Pages are cached as soon as they are
+fetched, so an interrupted crawl resumes from where it stopped.
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+
+MODES = ["revalidate", "fresh", "replay", "off"]
+CACHE_DIR = "clean_data/http_cache"
+FRESH_FOR = 3600
+
+MODE = "revalidate"
+STATS = {"hits": 0, "not_modified": 0, "stale": 0, "fetched": 0, "misses": 0}
+
+_lock = threading.Lock()
+
+
+def set_mode(mode):
+    '''
+    Sets how requests use the cache.
+    Inputs:
+        mode(str): "revalidate", "fresh" (no request for recently
+            fetched pages), "replay" (cache only) or "off".
+    '''
+    global MODE
+    assert mode in MODES, f"mode must be one of {MODES}"
+    MODE = mode
+
+
+def count(stat):
+    '''
+    Adds one to a counter in STATS.
+    '''
+    with _lock:
+        STATS[stat] += 1
+
+
+def cache_path(url):
+    '''
+    Path of the cache entry for a url, without extension.
+    '''
+    return os.path.join(CACHE_DIR, hashlib.sha256(url.encode()).hexdigest())
+
+
+def load(url):
+    '''
+    Reads the cache entry for a url.
+    Inputs:
+        url(str): the url.
+    Returns:
+        (tuple) entry metadata dict and body bytes, or None.
+    '''
+    path = cache_path(url)
+    try:
+        with open(path + ".json", "r") as file:
+            entry = json.load(file)
+        with open(path + ".body", "rb") as file:
+            body = file.read()
+    except (OSError, ValueError):
+        return None
+    return entry, body
+
+
+def store(url, entry, body=None):
+    '''
+    Writes the cache entry for a url. Files are replaced atomically, so
+    an interrupted write never leaves a broken entry.
+    Inputs:
+        url(str): the url.
+        entry(dict): metadata (headers, encoding, fetch time).
+        body(bytes): the response body, None to keep the stored one.
+    '''
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(url)
+    if body is not None:
+        with open(path + ".body.tmp", "wb") as file:
+            file.write(body)
+        os.replace(path + ".body.tmp", path + ".body")
+    with open(path + ".json.tmp", "w") as file:
+        json.dump(entry, file)
+    os.replace(path + ".json.tmp", path + ".json")
+
+
+def to_response(url, entry, body):
+    '''
+    Builds a requests.Response from a cache entry.
+    '''
+    r = requests.Response()
+    r.url = url
+    r.status_code = 200
+    r._content = body
+    r.encoding = entry["encoding"]
+    r.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+    return r
+
+
+def get(url, fetch):
+    '''
+    Gets a url through the cache.
+    Inputs:
+        url(str): absolute URL.
+        fetch(function): fetch(url, headers) does the network request and
+            returns a request object (or None).
+    Returns:
+        request object or None.
+    '''
+    if MODE == "off":
+        return fetch(url, {})
+
+    cached = load(url)
+    if MODE == "replay":
+        count("hits" if cached else "misses")
+        return to_response(url, *cached) if cached else None
+
+    headers = {}
+    if cached:
+        entry, body = cached
+        if MODE == "fresh" and time.time() - entry["fetched_at"] < FRESH_FOR:
+            count("hits")
+            return to_response(url, entry, body)
+        if "ETag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if "Last-Modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+    try:
+        r = fetch(url, headers)
+    except requests.RequestException:
+        if not cached:
+            raise
+        r = None
+    if cached and (r is None or r.status_code >= 500):
+        #the server is down, the last copy is better than nothing
+        count("stale")
+        return to_response(url, entry, body)
+    if r is not None and r.status_code == 304 and cached:
+        count("not_modified")
+        entry["fetched_at"] = time.time()
+        store(url, entry)
+        return to_response(url, entry, body)
+
+    if r is not None and r.status_code == 200:
+        count("fetched")
+        store(url, {"url": url,
+                    "encoding": r.encoding,
+                    "fetched_at": time.time(),
+                    "headers": {key: r.headers[key] for key in ["ETag", "Last-Modified"]
+                                if key in r.headers}},
+              r.content)
+    return r
+
+
+def get_request(url):
+    '''
+    Plain requests.get through the cache, for util.get_request.
+    Inputs:
+        url(str): absolute URL.
+    Returns:
+        request object or None.
+    '''
+    return get(url, lambda url, headers: requests.get(url, headers=headers))
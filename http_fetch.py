@@ -0,0 +1,147 @@
+'''
+Pooled, rate-limited HTTP fetching for the crawler
+
+Requests share one requests.Session (so connections are kept alive and
+reused), each host gets at most one request per MIN_INTERVAL seconds,
+and failed requests are retried with exponential backoff. Every request
+is added to the running TOTALS, and the last MAX_METRICS are kept in
+METRICS with their status, latency and number of attempts.
+'''
+
+import collections
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import util
+import http_cache
+
+TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+MIN_INTERVAL = 0.2
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+MAX_METRICS = 1000
+
+METRICS = collections.deque(maxlen=MAX_METRICS)
+TOTALS = {"requests": 0, "retries": 0, "statuses": {}, "total_latency": 0.0,
+          "max_latency": 0.0}
+
+_session = requests.Session()
+_lock = threading.Lock()
+_next_request_time = {}
+
+
+def set_pool_size(size):
+    '''
+    Sizes the connection pool of the shared session
+    Inputs:
+        size(int): number of connections kept per host.
+    '''
+    adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    _session.mount("http://", adapter)
+    _session.mount("https://", adapter)
+
+
+def wait_for_host(url):
+    '''
+    Blocks until the host of the url can take another request.
+    Inputs:
+        url(str): the url about to be requested.
+    '''
+    host = urllib.parse.urlparse(url).netloc
+    with _lock:
+        now = time.monotonic()
+        start = max(now, _next_request_time.get(host, now))
+        _next_request_time[host] = start + MIN_INTERVAL
+    time.sleep(start - now)
+
+
+def get_request(url, timeout=TIMEOUT, retries=RETRIES):
+    '''
+    Same as util.get_request (including the http_cache lookup), but
+    through the shared session with a timeout, per-host rate limiting
+    and retries with backoff.
+    Inputs:
+        url(str): must be an absolute URL.
+        timeout(float): seconds to wait for the server.
+        retries(int): number of retries after the first attempt.
+    Returns:
+        request object or None.
+    '''
+    if not util.is_absolute_url(url):
+        return None
+
+    r = http_cache.get(url, lambda url, headers: fetch(url, headers, timeout, retries))
+    if r is not None and r.status_code in [403, 404] + RETRY_STATUSES:
+        r = None
+    return r
+
+
+def fetch(url, headers, timeout, retries):
+    '''
+    Does the network request for get_request and records its metrics.
+    Inputs:
+        url(str): absolute URL.
+        headers(dict): request headers.
+        timeout(float): seconds to wait for the server.
+        retries(int): number of retries after the first attempt.
+    Returns:
+        request object or None.
+    '''
+    start = time.monotonic()
+    r = None
+    status = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(BACKOFF * 2 ** (attempt - 1))
+        wait_for_host(url)
+        try:
+            r = _session.get(url, headers=headers, timeout=timeout)
+            status = r.status_code
+        except requests.RequestException as e:
+            r = None
+            status = type(e).__name__
+            continue
+        if status not in RETRY_STATUSES:
+            break
+
+    latency = time.monotonic() - start
+    with _lock:
+        METRICS.append({"url": url, "status": status, "attempts": attempt + 1,
+                        "latency": latency})
+        TOTALS["requests"] += 1
+        TOTALS["retries"] += attempt
+        TOTALS["statuses"][status] = TOTALS["statuses"].get(status, 0) + 1
+        TOTALS["total_latency"] += latency
+        TOTALS["max_latency"] = max(TOTALS["max_latency"], latency)
+    return r
+
+
+def get_requests(urls, max_workers=8):
+    '''
+    Fetches a list of urls concurrently.
+    Inputs:
+        urls(list): absolute URLs.
+        max_workers(int): number of requests in flight at once.
+    Returns:
+        list of request objects (or None), in the order of urls.
+    '''
+    set_pool_size(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_request, urls))
+
+
+def summarize_metrics():
+    '''
+    Summarizes every request made so far.
+    Returns:
+        dict with the number of requests, the number of retries, the
+        count per final status and the mean and max latency in seconds.
+    '''
+    with _lock:
+        totals = dict(TOTALS, statuses=dict(TOTALS["statuses"]))
+    total_latency = totals.pop("total_latency")
+    totals["mean_latency"] = total_latency / totals["requests"] if totals["requests"] else 0
+    return totals
@@ -0,0 +1,79 @@
+'''
+Import-time budget check
+
+Imports a module in a fresh interpreter with -X importtime and reports
+what each imported module cost. The check fails if the import takes
+longer than the budget or pulls in one of HEAVY_MODULES, which the
+entry points (run_wage_model) only import in the stage that needs them.
+'''
+
+import subprocess
+import sys
+
+BUDGET_MS = 150
+HEAVY_MODULES = ["pandas", "numpy", "plotly", "requests", "bs4"]
+
+
+def import_times(module):
+    '''
+    Imports a module in a fresh interpreter and times every import.
+    Inputs:
+        module(str): name of the module to import.
+    Returns:
+        list of (module name, self ms, cumulative ms) tuples of the module
+        and the imports it triggers, in import order, without what the
+        interpreter imports at startup. Nested names are indented.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        #nested imports keep their indentation
+        name = name[1:].rstrip()
+        if name == module:
+            times.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+            return times
+        if name == name.lstrip():
+            #a top level import of the interpreter startup
+            times = []
+        else:
+            times.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return times
+
+
+def check(module="run_wage_model", budget_ms=BUDGET_MS, top=10):
+    '''
+    Reports the import cost of a module and its most expensive imports
+    and checks it against the budget.
+    Inputs:
+        module(str): name of the module to import.
+        budget_ms(float): largest total import time allowed.
+        top(int): number of most expensive imports to report.
+    Returns:
+        (bool) whether the import is within budget and imports none of
+        HEAVY_MODULES.
+    '''
+    times = import_times(module)
+    total = times[-1][2]
+    heavy = sorted({name.strip().split(".")[0] for name, _, _ in times} &
+                   set(HEAVY_MODULES))
+
+    print(f"import {module}: {total:.1f} ms (budget {budget_ms} ms)")
+    for name, self_ms, cumulative_ms in sorted(times, key=lambda t: -t[2])[1:top + 1]:
+        print(f"    {cumulative_ms:8.1f} ms  {self_ms:8.1f} ms self  {name.strip()}")
+    if heavy:
+        print("heavy modules imported at startup:", ", ".join(heavy))
+
+    return total <= budget_ms and not heavy
+
+
+if __name__ == "__main__":
+    usage = "python3 import_budget.py [module] [budget_ms]"
+    module = sys.argv[1] if len(sys.argv) > 1 else "run_wage_model"
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else BUDGET_MS
+    sys.exit(0 if check(module, budget_ms) else 1)
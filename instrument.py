@@ -0,0 +1,225 @@
+'''
+Opt-in per-stage instrumentation of the pipeline modules
+
+Functions decorated with @stage("name") are timed when tracing is on,
+and each call appends one JSON line to the trace file with:
+
+    stage, parent       name of the stage and of the stage it ran in
+    pid, start          process and start time (seconds since the epoch)
+    wall_seconds        elapsed time
+    cpu_seconds         CPU time of the process
+    peak_rss_bytes      peak resident memory of the process during the stage
+    rows_in, rows_out   rows of the first argument and of the result, for
+                        DataFrames, Series and arrays
+    bytes_read          bytes the process passed through read and write
+    bytes_written       calls (files and sockets), memory-mapped reads of
+                        the hh_store are not counted
+    network_requests    requests sent by http_fetch
+    cache_hits          http_cache and census_client cache hits
+    error               exception the stage raised, if any
+
+Tracing is turned on with enable() or by setting WAGE_MODEL_TRACE to
+the trace file before the run (worker processes then trace into the
+same file), and WAGE_MODEL_PROFILE to a comma separated list of stages
+also writes a cProfile dump of each of them next to the trace. When it
+is off a decorated function costs one flag check per call.
+
+Memory, CPU, I/O and request counts are measured for the whole process
+over the span of the stage, so stages running at the same time in
+different threads (see pipeline.go max_workers) are counted in each
+other's records.
+'''
+
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+TRACE_FILE = os.environ.get("WAGE_MODEL_TRACE")
+PROFILE_STAGES = set(filter(None, os.environ.get("WAGE_MODEL_PROFILE", "").split(",")))
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def enable(filename, profile=()):
+    '''
+    Turns tracing on for the rest of the run.
+    Inputs:
+        filename(str): trace file, records are appended to it.
+        profile(list): names of the stages to write cProfile dumps of.
+    '''
+    global TRACE_FILE, PROFILE_STAGES
+    TRACE_FILE = filename
+    PROFILE_STAGES = set(profile)
+    #worker processes started from here trace too
+    os.environ["WAGE_MODEL_TRACE"] = filename
+    os.environ["WAGE_MODEL_PROFILE"] = ",".join(profile)
+
+
+def disable():
+    '''
+    Turns tracing off.
+    '''
+    global TRACE_FILE
+    TRACE_FILE = None
+    os.environ.pop("WAGE_MODEL_TRACE", None)
+
+
+def stage(name):
+    '''
+    Decorator that records every call of a function as a stage.
+    Inputs:
+        name(str): name of the stage in the trace.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if TRACE_FILE is None:
+                return func(*args, **kwargs)
+            return run(name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def run(name, func, args, kwargs):
+    '''
+    Calls a stage function and writes its record to the trace.
+    '''
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    #the peak is reset for every stage, the enclosing stage keeps the
+    #peak so far and those of its child stages
+    if stack:
+        stack[-1]["peak_rss"] = max(stack[-1]["peak_rss"], peak_rss())
+    stack.append({"name": name, "peak_rss": 0})
+    profiler = cProfile.Profile() if name in PROFILE_STAGES else None
+
+    record = {"stage": name, "parent": stack[-2]["name"] if len(stack) > 1 else None,
+              "pid": os.getpid(), "start": time.time(), "rows_in": rows(args[0] if args else None)}
+    counters = read_counters()
+    reset_peak_rss()
+    start, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        result = func(*args, **kwargs)
+        record["error"] = None
+        return result
+    except BaseException as e:
+        result = None
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record["wall_seconds"] = time.perf_counter() - start
+        record["cpu_seconds"] = time.process_time() - start_cpu
+        record["peak_rss_bytes"] = max(peak_rss(), stack.pop()["peak_rss"])
+        if stack:
+            stack[-1]["peak_rss"] = max(stack[-1]["peak_rss"], record["peak_rss_bytes"])
+        record["rows_out"] = rows(result)
+        record.update({key: value - counters[key]
+                       for key, value in read_counters().items()})
+        write(record)
+        if profiler is not None:
+            profiler.dump_stats(f"{TRACE_FILE}.{name}.{os.getpid()}.prof")
+
+
+def rows(value):
+    '''
+    Number of rows of a DataFrame, Series or array, None for anything else.
+    '''
+    shape = getattr(value, "shape", None)
+    return int(shape[0]) if shape else None
+
+
+def read_counters():
+    '''
+    Current totals of the process-wide counters of the trace records.
+    Modules that were not imported count as zero.
+    '''
+    io = {}
+    try:
+        with open("/proc/self/io", "r") as file:
+            io = dict(line.split(": ") for line in file.read().splitlines())
+    except OSError:
+        pass
+    http_fetch = sys.modules.get("http_fetch")
+    http_cache = sys.modules.get("http_cache")
+    census_client = sys.modules.get("census_client")
+    return {"bytes_read": int(io.get("rchar", 0)),
+            "bytes_written": int(io.get("wchar", 0)),
+            "network_requests": http_fetch.TOTALS["requests"] if http_fetch else 0,
+            "cache_hits": ((http_cache.STATS["hits"] + http_cache.STATS["not_modified"]
+                            if http_cache else 0) +
+                           (census_client.STATS["cached"] if census_client else 0))}
+
+
+def reset_peak_rss():
+    '''
+    Sets the peak resident memory of the process back to the current one,
+    where Linux allows it.
+    '''
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    '''
+    Peak resident memory of the process in bytes, since the last
+    reset_peak_rss if it worked.
+    '''
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def write(record):
+    '''
+    Appends a record to the trace file as one line.
+    '''
+    line = json.dumps(record) + "\n"
+    with _lock:
+        with open(TRACE_FILE, "a") as file:
+            file.write(line)
+
+
+def summarize(filename):
+    '''
+    Totals of the records of a trace per stage.
+    Inputs:
+        filename(str): trace file.
+    Returns:
+        dict of stage name to the number of calls and the sums of the
+        time, row, byte and request fields, and the largest peak RSS.
+    '''
+    summary = {}
+    with open(filename, "r") as file:
+        for line in file:
+            record = json.loads(line)
+            totals = summary.setdefault(record["stage"], {"calls": 0, "peak_rss_bytes": 0})
+            totals["calls"] += 1
+            totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], record["peak_rss_bytes"])
+            for key in ["wall_seconds", "cpu_seconds", "rows_in", "rows_out", "bytes_read",
+                        "bytes_written", "network_requests", "cache_hits"]:
+                totals[key] = totals.get(key, 0) + (record[key] or 0)
+    return summary
+
+
+if __name__ == "__main__":
+    usage = "python3 instrument.py <trace_file>"
+    print(json.dumps(summarize(sys.argv[1]), indent=2))
@@ -4,29 +4,55 @@ Uses Dr. Lamont Samuel's utility code for webpage crawling
 '''
 
 import re
+import html
+import html.parser
 import bs4
+import numpy as np
 import pandas as pd
 import util
+import http_fetch
+import http_cache
+import instrument
+
+STATE_URL = "https://livingwage.mit.edu/states/{}/locations"
 
 TYPE_CLASSIFICATIONS = {"living_wage": "odd results",
                         "poverty_wage" : "even",
                         "minimum_wage": "odd"}
 
+#request of a page whose fetch already failed, so it is not fetched again
+FETCH_FAILED = object()
+
 
-def go(data_filename):
+@instrument.stage("crawl")
+def go(data_filename, max_workers=8,
+       starting_url=STATE_URL.format("17"),
+       limiting_domain="livingwage.mit.edu", cache_mode="revalidate",
+       county_names=None):
     """
     Final function to run everything.
     Inputs:
         data_filename(str): File name for exporting the dataframe.
+        max_workers(int): number of county pages fetched at once
+            (1 fetches them one at a time).
+        starting_url(str): the page listing the counties.
+        limiting_domain(str): the domain of the county pages.
+        cache_mode(str): "revalidate" to reuse cached pages the server
+            reports unchanged, "fresh" to also skip the request for pages
+            fetched in the last hour, "replay" to crawl only from the
+            cache with no network, or "off" (see http_cache).
+        county_names(dict): maps the FIPS code of each county to its
+            Census name. If given, counties are named from the FIPS code in
+            the page link instead of the page title, which only works for
+            Illinois (see STATE_URL for the starting url of other states).
     Returns:
-        Nothing. Exports the data to a csv file.
+        df(pandas dataframe): the wage data. Also exports it to a csv file.
     """
 
-    starting_url = ("https://livingwage.mit.edu/states/17/locations")
-    limiting_domain = "livingwage.mit.edu"
+    http_cache.set_mode(cache_mode)
     soup = get_soup(starting_url)
     links = get_links(soup, starting_url, limiting_domain)
-    df = create_full_dataframe(links)
+    df = create_full_dataframe(links, max_workers, county_names)
     replace = {"Clair County" : "St. Clair County",
     "Island County": "Rock Island County",
     "Daviess County": "Jo Daviess County",
@@ -34,6 +60,7 @@ def go(data_filename):
     "Salle County": "LaSalle County"}
     df["County"] = df["County"].replace(replace)
     df.to_csv(data_filename, index = False)
+    return df
 
 
 def clean_url(url2, url1 = None):
@@ -75,15 +102,18 @@ def get_links(soup, url, limiting_domain):
         return []
 
 
-def get_soup(link):
+def get_soup(link, request=None):
     """
     Gets the soup object from a link.
     Inputs:
         link(str): the link
+        request: the request object for the link if it was
+            already fetched
     Returns:
         soup(bs4 object): the associated soup object
     """
-    request = util.get_request(link)
+    if request is None:
+        request = util.get_request(link)
     if request is not None:
         html = util.read_request(request)
         if html is not None:
@@ -91,104 +121,132 @@ def get_soup(link):
     return soup
 
 
-def get_titles_adult(table):
+class ResultsTableParser(html.parser.HTMLParser):
+    """
+    Collects the rows of an html table as (class attribute, cell texts).
+    Only the results table is fed to it, so nothing else on the page
+    is parsed.
     """
-    Gets the household types by number of adults.
-    Inputs:
-        table(bs4 object): html tag that contains the table in the link.
-    Returns:
-        rv(list): the adult types.
-    """
-    adults = str(table.find('tr')).split("\n")[2:5]
-    rv = []
-    for i in adults:
-        adult = re.findall(r"\d\s\w*", i)
-        if len(adult) > 1:
-            adult = adult[0] + " " + adult[1]
-            rv.append(adult)
-        else:
-            rv.append(adult[0])
-    return rv
 
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.cell = None
 
-def get_titles_children(table):
-    """
-    Gets the household types by number of children.
-    Inputs:
-        table(bs4 object): html tag that contains the table in the link.
-    Returns:
-        rv(list): types of families by children.
-    """
-    children = str(table.find_all('tr')[1]).split("\n")[2:6]
-    rv = []
-    for i in children:
-        child = re.findall(r"(\d)\xa0(\w*)", i)[0]
-        rv.append(child[0] + ' ' + child[1])
-    return rv
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self.rows.append((dict(attrs).get("class", ""), []))
+        elif tag in ("td", "th") and self.rows:
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self.cell is not None:
+            self.rows[-1][1].append("".join(self.cell))
+            self.cell = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
 
 
-def get_values(table, classification):
+def extract_results_table(page):
     """
-    Gets the living wage values by household type.
+    Pulls the title and the results table out of a county page. Only the
+    title and the table are parsed, and the wage rows come back as floats.
     Inputs:
-        table(bs4 object): html tag that contains the table in the link.
-        classifications (dictionary): classifications for the different wage types.
+        page(str): html of the page.
     Returns:
-        values(list): the wage values.
+        rv(dict): "title" (str), and if the page has a results table,
+            "adults" and "children" (lists of family structure labels) and
+            "living_wage", "poverty_wage", "minimum_wage" (float arrays,
+            one value per family structure).
     """
-    class_val = TYPE_CLASSIFICATIONS[classification]
-    if class_val == "odd":
-        value_str = str(table.find_all("tr", class_=class_val)[1].find_all('td')[1:])
-    else:
-        value_str = str(table.find("tr", class_=class_val).find_all('td')[1:])
-    values = re.findall(r"\d+.\d+", value_str)
-    return values
+    title = re.search(r"<title[^>]*>(.*?)</title>", page, re.S)
+    rv = {"title": html.unescape(title.group(1)) if title else ""}
+
+    class_pos = page.find('class="results_table')
+    if class_pos == -1:
+        return rv
+    parser = ResultsTableParser()
+    parser.feed(page[page.rfind("<table", 0, class_pos):
+                     page.find("</table>", class_pos) + len("</table>")])
+    parser.close()
+    rows = parser.rows
 
+    rv["adults"] = []
+    for cell in rows[0][1][1:4]:
+        adult = re.findall(r"\d\s\w*", cell)
+        rv["adults"].append(" ".join(adult[:2]))
+    rv["children"] = [" ".join(re.findall(r"(\d)\xa0(\w*)", cell)[0])
+                      for cell in rows[1][1][1:5]]
 
-def scrape_county_level_data(link):
+    for classification, class_val in TYPE_CLASSIFICATIONS.items():
+        matches = [cells for row_class, cells in rows
+                   if row_class == class_val or class_val in row_class.split()]
+        cells = matches[1] if class_val == "odd" else matches[0]
+        rv[classification] = np.array(re.findall(r"\d+.\d+", " ".join(cells[1:])),
+                                      dtype=float)
+    return rv
+
+
+def scrape_county_level_data(link, request=None, county_names=None):
     """
     Helper function for create_single_dataframe
     Scrapes the link for county level wage classifications data.
     Inputs:
         link(str): the link to be scraped
+        request: the request object for the link if it was
+            already fetched, FETCH_FAILED if fetching it failed
+        county_names(dict): FIPS code to county name, see go
     Returns:
-        rv(list): county level information
+        rv(list): county level information, only [[None]] if the page
+            could not be fetched
     """
-    soup = get_soup(link)
-    title = str(soup.find('title'))
-    county = re.findall(r"\w*\sCounty", title)
+    if request is None:
+        request = util.get_request(link)
+    if request is None or request is FETCH_FAILED:
+        #the county is left out
+        print("fetch failed, skipping: " + link)
+        return [[None]]
+    page = extract_results_table(request.text)
+    title = page["title"]
+    if county_names is None:
+        county = re.findall(r"\w*\sCounty", title)
+        #check if it is a county level Illinois data page
+        is_county_page = "County, Illinois" in title
+    else:
+        fips = link.rstrip("/").rsplit("/", 1)[-1]
+        county = [county_names.get(fips)]
+        is_county_page = fips in county_names and "adults" in page
     rv = [county]
-    if "County, Illinois" in str(title): #check if it is a county level Illinois data page
-        table = soup.find('table', class_ = "results_table table-striped")
-        adults = get_titles_adult(table)
-        children = get_titles_children(table)
-        living_wage = get_values(table, "living_wage")
-        poverty_wage = get_values(table, "poverty_wage")
-        minimum_wage = get_values(table, "minimum_wage")
+    if is_county_page:
         index = 0
-        for adult in adults:
-            for child in children:
+        for adult in page["adults"]:
+            for child in page["children"]:
                 row = []
                 row.append(adult + child)
-                row.append(float(living_wage[index]))
-                row.append(float(poverty_wage[index]))
-                row.append(float(minimum_wage[index]))
+                row.append(page["living_wage"][index])
+                row.append(page["poverty_wage"][index])
+                row.append(page["minimum_wage"][index])
                 rv.append(row)
                 index += 1
     return rv
 
 
-def create_single_dataframe(link):
+def create_single_dataframe(link, request=None, county_names=None):
     """
     Creates a single data frame for a county level data.
     Inputs:
         Link(str): the link that contains county level data.
+        request: the request object for the link if it was
+            already fetched, FETCH_FAILED if fetching it failed
+        county_names(dict): FIPS code to county name, see go
     Returns:
         df(pandas dataframe): dataframe for county level wage data.
     """
 
     data = []
-    county_data = scrape_county_level_data(link)
+    county_data = scrape_county_level_data(link, request, county_names)
     for value in county_data[1:]:
         row = [county_data[0][0], value[0], value[1], value[2], value[3]]
         data.append(row)
@@ -197,18 +255,28 @@ def create_single_dataframe(link):
     return df
 
 
-def create_full_dataframe(links):
+def create_full_dataframe(links, max_workers=1, county_names=None):
     """
     Creates the full dataframe with different counties.
     Inputs
         Links(lst): list of all the county level data links to be scraped.
+        max_workers(int): number of pages fetched at once. With more than
+            one, pages are fetched concurrently through http_fetch and then
+            parsed in link order, so the dataframe is the same.
+        county_names(dict): FIPS code to county name, see go
     Returns
-        df(pandas dataframe): Data Frame that contains all the wage data for Illinois Counties.
+        df(pandas dataframe): Data Frame that contains all the wage data for the counties.
     """
 
+    if max_workers > 1:
+        requests = [FETCH_FAILED if request is None else request
+                    for request in http_fetch.get_requests(links, max_workers)]
+    else:
+        requests = [None] * len(links)
+
     frames = []
-    for link in links:
-        frames.append(create_single_dataframe(link))
+    for link, request in zip(links, requests):
+        frames.append(create_single_dataframe(link, request, county_names))
     df = pd.concat(frames)
     return df
 
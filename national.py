@@ -0,0 +1,170 @@
+"""
+Nationwide run of the model, sharded by state
+
+Each state is run from start to finish (Census data, MIT living wages,
+household level data and master data) by a worker process, with its raw
+and clean data under raw_data/states/<ST> and clean_data/states/<ST>.
+A worker holds the household level data of one state at a time and is
+replaced after every state, so peak memory per worker is set by the
+largest state. The county-level master data of the states is then merged
+into one national master data set.
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import pandas as pd
+from us import states
+import census_api
+import lw_crawler
+import gen_hh_level_data
+import gen_lw_dict
+import gen_agg_data
+
+#the 50 states and DC, which the MIT calculator also covers
+STATES = sorted([state.abbr for state in states.STATES] + [states.DC.abbr])
+RAW_DIR = "raw_data/states"
+CLEAN_DIR = "clean_data/states"
+
+
+def state_dirs(state):
+    '''
+    Raw and clean data directories of a state
+
+    Inputs:
+        - state (string): postal abbreviation
+    Outputs:
+        - (tuple) raw data directory, clean data directory
+    '''
+    return os.path.join(RAW_DIR, state), os.path.join(CLEAN_DIR, state)
+
+
+def pull_sources(state, raw_dir, refresh_sources=True, crawl_workers=2):
+    '''
+    Pulls the Census and MIT Living Wage data of a state, or reads it
+    from raw_dir if it is there and refresh_sources is False
+
+    Inputs:
+        - state (string): postal abbreviation
+        - raw_dir (string): raw data directory of the state
+        - refresh_sources (boolean): whether to pull the data again
+        - crawl_workers (int): county pages fetched at once. The per-host
+                               rate limit of http_fetch applies per
+                               process, so keep this low
+    Outputs:
+        - (tuple) income buckets, household sizes, county info and
+                  living wage DataFrame
+    '''
+    census_files = [os.path.join(raw_dir, "income_buckets.json"),
+                    os.path.join(raw_dir, "household_sizes.json"),
+                    os.path.join(raw_dir, "county_info.json")]
+    if refresh_sources or not all(os.path.exists(f) for f in census_files):
+        income_status, household_sizes, county_info = census_api.go(
+            *census_files, state=state, refresh=refresh_sources)
+    else:
+        census_data = []
+        for census_file in census_files:
+            with open(census_file, "r") as file:
+                census_data.append(json.load(file))
+        income_status, household_sizes, county_info = census_data
+
+    lw_file = os.path.join(raw_dir, "living_wage_data.csv")
+    if refresh_sources or not os.path.exists(lw_file):
+        county_names = {fips: name for county in county_info.values()
+                        for name, fips in county.items()}
+        living_wage_df = lw_crawler.go(lw_file, crawl_workers,
+                                       lw_crawler.STATE_URL.format(states.lookup(state).fips),
+                                       county_names=county_names)
+    else:
+        living_wage_df = pd.read_csv(lw_file)
+
+    return income_status, household_sizes, county_info, living_wage_df
+
+
+def run_state(state, new_wage=15, full_gen=True, refresh_sources=True,
+              engine="household", file_format="store", crawl_workers=2):
+    '''
+    Runs the model for one state
+
+    Inputs:
+        - state (string): postal abbreviation
+        - new_wage (int): proposed new federal minimum wage
+        - full_gen (boolean): whether to regenerate the underlying data,
+                              otherwise only the master data is generated
+                              from the data of an earlier run
+        - refresh_sources (boolean): whether to pull the Census and MIT
+                                     data again even if it is on disk
+        - engine, file_format (string): see gen_agg_data.go
+        - crawl_workers (int): see pull_sources
+    Outputs:
+        - (DataFrame) county-level master data of the state, with a
+                      State column
+    '''
+    raw_dir, clean_dir = state_dirs(state)
+    os.makedirs(raw_dir, exist_ok=True)
+    os.makedirs(clean_dir, exist_ok=True)
+
+    if full_gen:
+        income_status, household_sizes, county_info, living_wage_df = \
+            pull_sources(state, raw_dir, refresh_sources, crawl_workers)
+        living_wage_dict = gen_lw_dict.go(os.path.join(clean_dir, "living_wages_by_county.json"),
+                                          [dict(hh) for hh in household_sizes],
+                                          county_info, living_wage_df)
+        if engine == "household":
+            hh_df = gen_hh_level_data.go(os.path.join(clean_dir, "hh_level_data"),
+                                         file_format, income_status, county_info)
+            gen_agg_data.gen_lw_data(file_format, hh_df, living_wage_dict, clean_dir)
+
+    master_df = gen_agg_data.go(new_wage, filename=os.path.join(clean_dir, "master_data.csv"),
+                                engine=engine, file_format=file_format,
+                                raw_dir=raw_dir, clean_dir=clean_dir)
+    master_df = master_df.reset_index(drop=True)
+    master_df.insert(1, "State", state)
+    return master_df
+
+
+def go(new_wage=15, state_list=STATES, full_gen=True, refresh_sources=True,
+       max_workers=4, filename="clean_data/national_master_data.csv", **kwargs):
+    '''
+    Runs the model for a list of states in a process pool and merges
+    their master data
+
+    Inputs:
+        - new_wage (int): proposed new federal minimum wage
+        - state_list (list of strings): postal abbreviations
+        - full_gen, refresh_sources: see run_state
+        - max_workers (int): number of states run at once
+        - filename (string): filename to save the national dataset to
+        - kwargs: engine, file_format and crawl_workers, see run_state
+    Outputs:
+        - (DataFrame) national county-level master data, sorted by FIPS
+                      code. States that fail are reported and left out
+    '''
+    #a fresh process per state returns the memory of the previous state
+    #to the system
+    frames = []
+    with multiprocessing.get_context("spawn").Pool(max_workers, maxtasksperchild=1) as pool:
+        results = {state: pool.apply_async(run_state, (state, new_wage, full_gen,
+                                                       refresh_sources), kwargs)
+                   for state in state_list}
+        for state, result in results.items():
+            try:
+                frames.append(result.get())
+            except Exception as e:
+                print(f"{state} failed: {e}")
+
+    if not frames:
+        raise RuntimeError(f"all {len(state_list)} states failed, no national master data")
+    national_df = pd.concat(frames)
+    #leading zeros of the FIPS codes (e.g. Alabama, 01) are kept in the csv
+    national_df["FIP"] = national_df["FIP"].astype(str).str.zfill(5)
+    national_df = national_df.sort_values("FIP").reset_index(drop=True)
+    national_df.to_csv(filename, index=False)
+
+    return national_df
+
+
+if __name__ == "__main__":
+    usage = "python3 national.py <wage> <full_gen> [state ...]"
+    go(int(sys.argv[1]), sys.argv[3:] or STATES, bool(int(sys.argv[2])))
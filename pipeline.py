@@ -0,0 +1,258 @@
+"""
+In-process pipeline that generates the raw and clean data
+
+Each stage calls a module's go() function and hands its result to the
+stages that depend on it. Stages whose inputs have not changed since the
+last run are skipped, and stages that do not depend on each other run
+concurrently.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import census_api
+import lw_crawler
+import gen_hh_level_data
+import gen_lw_dict
+import gen_agg_data
+import hh_store
+import instrument
+from scenario_cache import hash_files
+
+STATE_FILE = "clean_data/pipeline_state.json"
+
+
+def run_census(results, params):
+    '''
+    Pulls the Census data, past the census_client cache if the sources
+    are refreshed
+    '''
+    return census_api.go(refresh=params["refresh_sources"])
+
+
+def run_crawler(results, params):
+    '''
+    Scrapes the MIT Living Wage data
+    '''
+    return lw_crawler.go("raw_data/living_wage_data.csv")
+
+
+def run_hh_level_data(results, params):
+    '''
+    Generates the household level income data
+    '''
+    census = results.get("census")
+    if census is None:
+        return gen_hh_level_data.go()
+    income_status, household_sizes, county_info = census
+    return gen_hh_level_data.go(county_income_info=income_status,
+                                county_id_info=county_info)
+
+
+def run_lw_dict(results, params):
+    '''
+    Generates the weighted living wages for each county
+    '''
+    census = results.get("census")
+    if census is None:
+        return gen_lw_dict.go(living_wage_df=results.get("crawler"))
+    income_status, household_sizes, county_info = census
+    return gen_lw_dict.go(hh_sizes_dicts=[dict(hh) for hh in household_sizes],
+                          county_info_dict=county_info,
+                          living_wage_df=results.get("crawler"))
+
+
+def run_lw_data(results, params):
+    '''
+    Generates the household level data with living wage variables
+    '''
+    return gen_agg_data.gen_lw_data(hh_df=results.get("hh_level_data"),
+                                    living_wage_dict=results.get("lw_dict"))
+
+
+def run_master_data(results, params):
+    '''
+    Generates the master data set for the new wage
+    '''
+    return gen_agg_data.go(params["new_wage"])
+
+
+#stage name -> what it depends on, the modules whose code it runs, the
+#pipeline parameters it uses, the files it writes, whether it pulls
+#external data and the function to run
+STAGES = {
+    "census": {"deps": [],
+               "modules": ["census_api.py", "census_client.py", "http_fetch.py"],
+               "params": [],
+               "outputs": ["raw_data/income_buckets.json",
+                           "raw_data/household_sizes.json",
+                           "raw_data/county_info.json"],
+               "source": True,
+               "message": "Pulling Census API...",
+               "run": run_census},
+    "crawler": {"deps": [],
+                "modules": ["lw_crawler.py", "util.py", "http_fetch.py",
+                            "http_cache.py"],
+                "params": [],
+                "outputs": ["raw_data/living_wage_data.csv"],
+                "source": True,
+                "message": "Scraping MIT Living Wage Data...",
+                "run": run_crawler},
+    "hh_level_data": {"deps": ["census"],
+                      "modules": ["gen_hh_level_data.py", "hh_store.py"],
+                      "params": [],
+                      "outputs": ["clean_data/hh_level_data"],
+                      "source": False,
+                      "message": "Generating household level income data...",
+                      "run": run_hh_level_data},
+    "lw_dict": {"deps": ["census", "crawler"],
+                "modules": ["gen_lw_dict.py"],
+                "params": [],
+                "outputs": ["clean_data/living_wages_by_county.json"],
+                "source": False,
+                "message": "Generating weighted living wages for counties...",
+                "run": run_lw_dict},
+    "lw_data": {"deps": ["hh_level_data", "lw_dict"],
+                "modules": ["gen_agg_data.py", "employment_model.py", "hh_store.py"],
+                "params": [],
+                "outputs": ["clean_data/hh_level_data_w_lw"],
+                "source": False,
+                "message": "Generating household level living wage data...",
+                "run": run_lw_data},
+    "master_data": {"deps": ["lw_data"],
+                    "modules": ["gen_agg_data.py", "gen_bin_agg_data.py",
+                                "employment_model.py", "hh_store.py"],
+                    "params": ["new_wage"],
+                    "outputs": ["clean_data/master_data.csv"],
+                    "source": False,
+                    "message": "Generating master data set...",
+                    "run": run_master_data}}
+
+
+def fingerprint(name, params, fingerprints):
+    '''
+    Fingerprints the inputs of a stage that does not pull external data:
+    its code, the parameters it uses and the fingerprints of its
+    dependencies.
+    The stages are deterministic, so the same fingerprint means the same
+    outputs and upstream outputs never need to be hashed.
+
+    Inputs:
+        - name (string): stage name
+        - params (dictionary): pipeline parameters
+        - fingerprints (dictionary): stage name to fingerprint
+    Outputs:
+        - (string) hex digest
+    '''
+    stage = STAGES[name]
+    digest = hashlib.sha256()
+    stage_params = {param: params[param] for param in stage["params"]}
+    digest.update(json.dumps([name, stage_params,
+                              [fingerprints[dep] for dep in stage["deps"]]],
+                             sort_keys=True).encode())
+    digest.update(hash_files(stage["modules"]).encode())
+    return digest.hexdigest()
+
+
+def outputs_exist(name):
+    '''
+    Whether every output of a stage exists
+    '''
+    return all(os.path.exists(output) for output in STAGES[name]["outputs"])
+
+
+def hash_outputs(name):
+    '''
+    Content hash of the outputs of a stage, None if one is missing.
+    Stores (directories) are identified by the digest in their meta.json.
+
+    Inputs:
+        - name (string): stage name
+    Outputs:
+        - (string) hex digest or None
+    '''
+    if not outputs_exist(name):
+        return None
+    digests = [hh_store.digest(output) if os.path.isdir(output) else hash_files([output])
+               for output in STAGES[name]["outputs"]]
+    return hashlib.sha256(json.dumps(digests).encode()).hexdigest()
+
+
+def go(new_wage=15, refresh_sources=True, max_workers=2):
+    '''
+    Runs the pipeline, skipping stages whose inputs have not changed and
+    whose outputs are still the ones the last run wrote (another program,
+    e.g. gen_agg_data.py with a different wage, may have replaced them).
+
+    Inputs:
+        - new_wage (int): proposed new federal minimum wage
+        - refresh_sources (boolean): whether to pull the Census and MIT
+                                     data again even if it is on disk
+        - max_workers (int): number of stages that can run at once
+    Outputs:
+        - (dictionary) stage name to "ran" or "skipped"
+    '''
+    params = {"new_wage": new_wage, "refresh_sources": refresh_sources}
+    try:
+        with open(STATE_FILE, "r") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        state = {}
+
+    results = {}
+    fingerprints = {}
+    status = {}
+    lock = threading.Lock()
+
+    def run_stage(name):
+        stage = STAGES[name]
+        run = instrument.stage("pipeline." + name)(stage["run"])
+        if stage["source"]:
+            if refresh_sources or not outputs_exist(name):
+                print(stage["message"])
+                results[name] = run(results, params)
+                status[name] = "ran"
+            else:
+                status[name] = "skipped"
+            fp = hash_files(stage["outputs"])
+        else:
+            fp = fingerprint(name, params, fingerprints)
+            saved = state.get(name)
+            if (isinstance(saved, dict) and saved["fingerprint"] == fp and
+                    saved["outputs"] == hash_outputs(name)):
+                status[name] = "skipped"
+            else:
+                print(stage["message"])
+                results[name] = run(results, params)
+                status[name] = "ran"
+        outputs = hash_outputs(name)
+        with lock:
+            fingerprints[name] = fp
+            state[name] = {"fingerprint": fp, "outputs": outputs}
+            os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+            with open(STATE_FILE, "w") as file:
+                json.dump(state, file)
+
+    pending = dict(STAGES)
+    running = {}
+    finished = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in [name for name, stage in pending.items()
+                         if all(dep in finished for dep in stage["deps"])]:
+                running[executor.submit(run_stage, name)] = name
+                del pending[name]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+                finished.add(running.pop(future))
+
+    return status
+
+
+if __name__ == "__main__":
+    usage = "python3 pipeline.py <wage>"
+    print(go(int(sys.argv[1])))
@@ -1,10 +1,13 @@
 
-import os
-import gen_plots
+import sys
 
 """
 This is an application module that allows a user to generate
 county based welfare
+
+Modules that pull in pandas, numpy or plotly are imported by the
+function of the stage that needs them, so the menus appear right away
+(see import_budget for the startup cost check).
 """
 
 WELCOME_MESSAGE = """
@@ -93,45 +96,53 @@ def get_user_wage():
     wage_input = int(input("Wage Input: "))
     return wage_input
 
-def generate_agg_data(wage_input):
+def generate_agg_data(wage_input, server_url=None):
     """
-    Function that calls the python file to generate
-    the aggregate data with the user wage input.
+    Function that generates the aggregate data
+    with the user wage input, in this process.
+    With a server url, the running scenario_server
+    computes it from the data it keeps in memory.
     """
     print(f"Updating minimum wage to {wage_input}...")
-    os.system(f"python3 gen_agg_data.py {wage_input} {0}")
+    if server_url is None:
+        import gen_agg_data
+        gen_agg_data.go(wage_input, False)
+    else:
+        import scenario_server
+        scenario_server.get_scenario(server_url, wage_input).to_csv(
+            "clean_data/master_data.csv", index = False)
 
 
 def generate_raw_clean_data(aspect_choice, wage_input):
     """
-    Function that calls the necessary python
-    files to generate raw and clean data.
+    Function that runs the pipeline to generate raw
+    and clean data. Stages whose inputs have not
+    changed since the last run are skipped.
     """
     assert aspect_choice == "A", "The user did not choose to run everything."
-    print("Pulling Census API...")
-    os.system("python3 census_api.py")
-    print("Scraping MIT Living Wage Data...")
-    os.system("python3 lw_crawler.py")
-    print("Generating household level income data...")
-    os.system("python3 gen_hh_level_data.py")
-    print("Generating weighted living wages for counties...")
-    os.system("python3 gen_lw_dict.py")
-    print("Generating master data set...")
-    os.system(f"python3 gen_agg_data.py {wage_input} {True}")
-
-
-def generate_visuals():
+    import pipeline
+    pipeline.go(wage_input)
+
+
+def generate_visuals(wage_input, model_choice):
     """
-    Function that calls the python
-    file to generate visuals.
+    Function that builds only the visual(s) the
+    user chose. Visuals already built for this
+    wage are reused.
     """
     print("Generating visual(s)...")
-    visuals = gen_plots._go("clean_data/master_data.csv")
+    import gen_plots
+    options = range(1, 7) if model_choice == 7 else [model_choice]
+    visuals = [gen_plots.get_figure(option, wage_input,
+                                    "clean_data/master_data.csv")
+               for option in options]
     return visuals
 
-def main():
+def main(server_url=None):
     """
     The main function that runs the application.
+    Wage queries go to the scenario_server at
+    server_url if one is given.
     """
     print(WELCOME_MESSAGE)
     ###### Getting the user input#######
@@ -145,7 +156,7 @@ def main():
     if aspect_choice == "A":
         generate_raw_clean_data(aspect_choice, wage_input)
     else:
-        generate_agg_data(wage_input)
+        generate_agg_data(wage_input, server_url)
     while True:
         model_choice = get_map_info()
         if model_choice == 8:
@@ -153,29 +164,12 @@ def main():
             print("Exited")
             return None
         print("Thank you, we are working on it now.")
-        p1, p2, p3, p4, p5, p6 = generate_visuals()
+        visuals = generate_visuals(wage_input, model_choice)
         print("Completed! Now you can take a look at the map(s)!")
-        if model_choice == 1:
-            p1.show()
-        elif model_choice == 2:
-            p2.show()
-        elif model_choice == 3:
-            p3.show()
-        elif model_choice == 4:
-            p4.show()
-        elif model_choice == 5:
-            p5.show()
-        elif model_choice == 6:
-            p6.show()
-        elif model_choice == 7:
-            p1.show()
-            p2.show()
-            p3.show()
-            p4.show()
-            p5.show()
-            p6.show()
+        for visual in visuals:
+            visual.show()
 
 if __name__ == "__main__":
     # This is the entry point into the application
-    usage = "python3 run_wage_model.py"
-    main()
+    usage = "python3 run_wage_model.py [scenario_server_url]"
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
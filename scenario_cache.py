@@ -0,0 +1,130 @@
+"""
+On-disk cache of the county-level results of gen_agg_data.go
+
+Each entry is a pickled DataFrame named after a hash of everything the
+result depends on (wage, engine, model code and a content hash of the
+data). When the cache grows past its byte budget the least recently
+used entries are deleted. Each clean data directory has its own cache
+(see cache_dir_for).
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import pandas as pd
+
+CACHE_DIR = "clean_data/scenario_cache"
+MAX_BYTES = 50 * 2**20
+
+
+def cache_dir_for(clean_dir="clean_data"):
+    '''
+    Cache directory of the results computed from a clean data directory
+    '''
+    return os.path.join(clean_dir, "scenario_cache")
+
+
+def hash_files(filenames):
+    '''
+    Hashes the contents of a list of files
+
+    Inputs:
+        - filenames (list of strings): files to hash
+    Outputs:
+        - (string) hex digest
+    '''
+    digest = hashlib.sha256()
+    for filename in filenames:
+        digest.update(filename.encode())
+        with open(filename, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(**parts):
+    '''
+    Builds a cache key from everything a result depends on
+
+    Inputs:
+        - parts: JSON serializable values, e.g. new_wage=15
+    Outputs:
+        - (string) hex digest
+    '''
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def get(key, cache_dir=CACHE_DIR):
+    '''
+    Looks up a cached result and marks it as recently used. An entry
+    that cannot be read back (left truncated by a crash, or pickled by
+    another pandas or numpy version) is deleted and counts as a miss
+
+    Inputs:
+        - key (string): output of make_key
+        - cache_dir (string): cache directory
+    Outputs:
+        - (DataFrame) the cached result or None
+    '''
+    path = os.path.join(cache_dir, key + ".pkl")
+    try:
+        df = pd.read_pickle(path)
+        os.utime(path)
+    except OSError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    return df
+
+
+def put(key, df, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    '''
+    Adds a result to the cache, then evicts the least recently used
+    entries until the cache fits in max_bytes
+
+    Inputs:
+        - key (string): output of make_key
+        - df (DataFrame): result to cache
+        - cache_dir (string): cache directory
+        - max_bytes (int): byte budget of the cache
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key + ".pkl")
+    df.to_pickle(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    '''
+    Deletes the least recently used entries until the cache fits in
+    max_bytes
+
+    Inputs:
+        - cache_dir (string): cache directory
+        - max_bytes (int): byte budget of the cache
+    '''
+    entries = []
+    for filename in os.listdir(cache_dir):
+        if filename.endswith(".pkl"):
+            try:
+                stat = os.stat(os.path.join(cache_dir, filename))
+            except FileNotFoundError:
+                #evicted by another process (e.g. a national.py worker)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, filename in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, filename))
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,229 @@
+'''
+Local HTTP/JSON service that answers wage scenarios from memory
+
+The wage-independent hh-level store (see gen_agg_data.gen_lw_data) is
+read into memory when the server starts, and again when a pipeline run
+rewrites it, and every request only runs the new wage stage on it:
+
+    GET /scenario?wage=15[&slope=..&intercept=..&scale=..]
+        county-level master data as a list of JSON records
+    GET /stats
+        number of requests and errors, latency and throughput
+
+The last MAX_RESULTS results are kept per wage and model, requests are
+served concurrently.
+run_wage_model uses get_scenario as a client when given a server url.
+'''
+
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import requests
+import employment_model
+import gen_agg_data
+import hh_store
+
+PORT = 8765
+MAX_RESULTS = 256
+
+
+class ScenarioData:
+    '''
+    The in-memory hh-level data and the results computed from it, with
+    the request counters
+    '''
+
+    def __init__(self, clean_dir="clean_data", max_results=MAX_RESULTS):
+        self.path = os.path.join(clean_dir, "hh_level_data_w_lw")
+        self.results = collections.OrderedDict()
+        self.max_results = max_results
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.stats = {"requests": 0, "errors": 0, "computed": 0, "reloads": 0,
+                      "total_latency": 0.0, "max_latency": 0.0}
+        self.meta, self.arrays, self.meta_stat = None, None, None
+        self.load()
+
+    def load(self):
+        '''
+        Reads the store into memory, unless meta.json has not changed since
+        the last read or the store still has the same digest.
+        '''
+        with self.load_lock:
+            #meta.json is replaced on every write, so a new file is a new inode
+            stat = os.stat(os.path.join(self.path, hh_store.META_FILE))
+            meta_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if meta_stat == self.meta_stat:
+                return
+            meta, arrays = hh_store.open_store(self.path)
+            if self.meta is None or meta.get("digest") != self.meta.get("digest"):
+                arrays = {col: np.array(values) for col, values in arrays.items()}
+                with self.lock:
+                    if self.meta is not None:
+                        self.stats["reloads"] += 1
+                    self.meta, self.arrays = meta, arrays
+            self.meta_stat = meta_stat
+
+    def scenario(self, new_wage, model=employment_model.CBO):
+        '''
+        County-level master data for a wage, computed on first request
+        Inputs:
+            new_wage(float): user-inputted minimum wage.
+            model(dict): coefficients of the employment model.
+        Returns:
+            (str) JSON list of county records.
+        '''
+        try:
+            self.load()
+        except (OSError, ValueError):
+            #caught in the middle of a rewrite, the next request reloads
+            pass
+        with self.lock:
+            meta, arrays = self.meta, self.arrays
+            key = (meta.get("digest"), new_wage,
+                   tuple(model[name] for name in employment_model.COEFFICIENTS))
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+        if result is None:
+            agg_df = gen_agg_data.agg_new_wage_vars(arrays, meta, new_wage, model)
+            #json writes floats exactly, numpy scalars are turned into
+            #python ones first
+            result = json.dumps(gen_agg_data.gen_new_vars(agg_df).to_dict(orient="records"),
+                                default=lambda value: value.item())
+            with self.lock:
+                self.results[key] = result
+                while len(self.results) > self.max_results:
+                    self.results.popitem(last=False)
+                self.stats["computed"] += 1
+        return result
+
+    def record(self, latency, error=False):
+        '''
+        Adds a request to the counters.
+        '''
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["errors"] += int(error)
+            self.stats["total_latency"] += latency
+            self.stats["max_latency"] = max(self.stats["max_latency"], latency)
+
+    def summary(self):
+        '''
+        Returns:
+            dict with the request counters, the mean and max latency in
+            seconds and the throughput in requests per second.
+        '''
+        with self.lock:
+            stats = dict(self.stats)
+        uptime = time.monotonic() - self.started_at
+        stats["mean_latency"] = (stats.pop("total_latency") / stats["requests"]
+                                 if stats["requests"] else 0.0)
+        stats["uptime"] = uptime
+        stats["throughput"] = stats["requests"] / uptime
+        return stats
+
+
+class ScenarioHandler(BaseHTTPRequestHandler):
+    '''
+    Answers /scenario and /stats from server.data.
+    '''
+
+    def do_GET(self):
+        start = time.monotonic()
+        parsed = urllib.parse.urlparse(self.path)
+        params = {name: values[0] for name, values
+                  in urllib.parse.parse_qs(parsed.query).items()}
+
+        if parsed.path == "/stats":
+            self.send_json(200, json.dumps(self.server.data.summary()))
+            return
+        if parsed.path != "/scenario":
+            self.send_json(404, json.dumps({"error": "unknown path"}))
+            return
+
+        try:
+            new_wage = float(params["wage"])
+            #whole wages stay ints, as in the master data of gen_agg_data.py
+            new_wage = int(new_wage) if new_wage.is_integer() else new_wage
+            model = {name: float(params.get(name, employment_model.CBO[name]))
+                     for name in employment_model.COEFFICIENTS}
+        except (KeyError, ValueError):
+            self.send_json(400, json.dumps({"error": "wage must be a number"}))
+            self.server.data.record(time.monotonic() - start, error=True)
+            return
+
+        try:
+            body = self.server.data.scenario(new_wage, model)
+        except Exception as e:
+            self.send_json(500, json.dumps({"error": str(e)}))
+            self.server.data.record(time.monotonic() - start, error=True)
+            return
+        self.send_json(200, body)
+        self.server.data.record(time.monotonic() - start)
+
+    def send_json(self, status, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(clean_dir="clean_data", port=PORT):
+    '''
+    Loads the data and starts the server in a background thread.
+    Inputs:
+        clean_dir(str): directory of the clean data.
+        port(int): port to listen on, 0 for any free port.
+    Returns:
+        the server, stop it with server.shutdown().
+    '''
+    server = ThreadingHTTPServer(("127.0.0.1", port), ScenarioHandler)
+    server.data = ScenarioData(clean_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def url(server):
+    '''
+    Base url of a running server.
+    '''
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def get_scenario(server_url, new_wage, timeout=60):
+    '''
+    Client side of /scenario.
+    Inputs:
+        server_url(str): base url of the server.
+        new_wage(float): user-inputted minimum wage.
+        timeout(float): seconds to wait for the server.
+    Returns:
+        (DataFrame) county-level master data.
+    '''
+    r = requests.get(server_url + "/scenario", params={"wage": new_wage}, timeout=timeout)
+    r.raise_for_status()
+    return pd.DataFrame(r.json())
+
+
+if __name__ == "__main__":
+    usage = "python3 scenario_server.py [port] [clean_dir]"
+    server = ThreadingHTTPServer(("127.0.0.1", int(sys.argv[1]) if len(sys.argv) > 1 else PORT),
+                                 ScenarioHandler)
+    server.data = ScenarioData(sys.argv[2] if len(sys.argv) > 2 else "clean_data")
+    print("Serving wage scenarios at", url(server))
+    server.serve_forever()
@@ -0,0 +1,86 @@
+"""
+Tests of census_client against census_stub
+"""
+
+import pytest
+import census_client
+import census_stub
+import http_fetch
+
+GEOGRAPHY = census_client.county_geography("17")
+COUNTIES = ["001", "003", "005"]
+#more than MAX_VARIABLES, so the query is split into two batches
+VARIABLES = [f"DP03_{i:04d}E" for i in range(60)]
+
+
+def record(value=1):
+    '''
+    Stores the responses of the batches of the query in CACHE_DIR, every
+    variable of county c set to c * 100 + value.
+    '''
+    for variables in census_client.batch_variables(VARIABLES):
+        table = [list(variables) + ["state", "county"]]
+        for county in COUNTIES:
+            table.append([str(int(county) * 100 + value)] * len(variables) +
+                         ["17", county])
+        census_client.store_batch(census_client.batch_key("acs5dp", 2019, GEOGRAPHY,
+                                                          variables), table)
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_fetch, "MIN_INTERVAL", 0)
+    monkeypatch.setattr(census_client, "CACHE_DIR", str(tmp_path / "recorded"))
+    record()
+    server = census_stub.start(str(tmp_path / "recorded"))
+    #the client caches elsewhere, so the stub's recordings are untouched
+    monkeypatch.setattr(census_client, "CACHE_DIR", str(tmp_path / "cache"))
+    yield census_stub.url(server)
+    server.shutdown()
+    server.server_close()
+
+
+def get(base_url, **kwargs):
+    return census_client.get([("acs5dp", 2019, GEOGRAPHY, VARIABLES)], base_url=base_url,
+                             **kwargs)[0]
+
+
+def test_batches_are_merged_per_county(stub):
+    fetched = census_client.STATS["fetched"]
+    rows = get(stub)
+
+    assert census_client.STATS["fetched"] == fetched + 2
+    assert [row["county"] for row in rows] == COUNTIES
+    for county, row in zip(COUNTIES, rows):
+        assert list(row) == VARIABLES + ["state", "county"]
+        assert all(row[var] == int(county) * 100 + 1.0 for var in VARIABLES)
+        assert row["state"] == "17"
+
+
+def test_repeated_pull_comes_from_the_cache(stub):
+    rows = get(stub)
+    requests, cached = http_fetch.TOTALS["requests"], census_client.STATS["cached"]
+
+    assert get(stub) == rows
+    assert http_fetch.TOTALS["requests"] == requests
+    assert census_client.STATS["cached"] == cached + 2
+
+
+def test_refresh_pulls_again(stub, tmp_path, monkeypatch):
+    get(stub)
+    with monkeypatch.context() as patch:
+        patch.setattr(census_client, "CACHE_DIR", str(tmp_path / "recorded"))
+        record(value=2)
+
+    requests = http_fetch.TOTALS["requests"]
+    assert get(stub)[0]["DP03_0000E"] == 101
+    rows = get(stub, refresh=True)
+    assert http_fetch.TOTALS["requests"] == requests + 2
+    assert rows[0]["DP03_0000E"] == 102
+    #the refreshed responses replace the cached ones
+    assert get(stub) == rows
+
+
+def test_unrecorded_query_fails(stub):
+    with pytest.raises(RuntimeError):
+        census_client.get([("acs5", 2019, GEOGRAPHY, ["B11016_002E"])], base_url=stub)
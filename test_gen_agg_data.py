@@ -0,0 +1,39 @@
+"""
+Tests of the engines of gen_agg_data
+"""
+
+import pandas as pd
+import employment_model
+import gen_agg_data
+import update_counties
+
+
+def test_bin_engine_matches_household_engine(tmp_path, write_synthetic):
+    raw_dir, clean_dir = str(tmp_path / "raw"), str(tmp_path / "clean")
+    write_synthetic(raw_dir, counties=6, hh_scale=0.2)
+    update_counties.go(15, raw_dir, clean_dir)
+
+    for new_wage in [12, 15, 17.5]:
+        diffs = gen_agg_data.compare_engines(new_wage, raw_dir=raw_dir, clean_dir=clean_dir)
+        assert {"Cost UB LW v New Wage", "Cost LB LW v New Wage"} <= set(diffs["Column"])
+        assert diffs["Within Tolerance"].all(), diffs[~diffs["Within Tolerance"]]
+
+
+def test_other_model_recomputes_living_wage_job_losses(tmp_path, write_synthetic):
+    raw_dir = str(tmp_path / "raw")
+    write_synthetic(raw_dir)
+    model = dict(employment_model.CBO, slope=employment_model.CBO["slope"] * 2)
+
+    for file_format in ["store", "csv"]:
+        cbo_dir = str(tmp_path / file_format / "cbo")
+        model_dir = str(tmp_path / file_format / "model")
+        update_counties.go(15, raw_dir, cbo_dir, file_format)
+        update_counties.go(15, raw_dir, model_dir, file_format, model)
+
+        kwargs = {"file_format": file_format, "use_cache": False, "raw_dir": raw_dir}
+        stored_df = gen_agg_data.go(15, filename=str(tmp_path / "stored.csv"),
+                                    clean_dir=cbo_dir, model=model, **kwargs)
+        expected_df = gen_agg_data.go(15, filename=str(tmp_path / "expected.csv"),
+                                      clean_dir=model_dir, model=model, **kwargs)
+        pd.testing.assert_frame_equal(stored_df.reset_index(drop=True),
+                                      expected_df.reset_index(drop=True))
@@ -0,0 +1,74 @@
+"""
+Tests of http_fetch against a local HTTP server
+"""
+
+import http.server
+import time
+import pytest
+import http_cache
+import http_fetch
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Answers 503 to the first FAILURES requests of a path, then 200.
+    '''
+    FAILURES = 2
+    hits = {}
+
+    def do_GET(self):
+        hits = FlakyHandler.hits[self.path] = FlakyHandler.hits.get(self.path, 0) + 1
+        status = 503 if hits <= self.FAILURES else 200
+        body = b"<html>ok</html>"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(serve, monkeypatch):
+    FlakyHandler.hits = {}
+    monkeypatch.setattr(http_cache, "MODE", "off")
+    monkeypatch.setattr(http_fetch, "BACKOFF", 0.05)
+    monkeypatch.setattr(http_fetch, "MIN_INTERVAL", 0)
+    return serve(FlakyHandler)
+
+
+def test_retries_with_backoff(server):
+    requests_before = http_fetch.TOTALS["requests"]
+    start = time.monotonic()
+    r = http_fetch.get_request(server + "/county")
+    elapsed = time.monotonic() - start
+
+    assert r is not None and r.status_code == 200
+    assert FlakyHandler.hits["/county"] == 3
+    #two retries wait BACKOFF, then 2 * BACKOFF
+    assert elapsed >= 3 * 0.05
+    assert http_fetch.METRICS[-1]["attempts"] == 3
+    assert http_fetch.TOTALS["requests"] == requests_before + 1
+
+
+def test_gives_up_after_retries(server):
+    r = http_fetch.get_request(server + "/down", retries=1)
+
+    assert r is None
+    assert FlakyHandler.hits["/down"] == 2
+    assert http_fetch.METRICS[-1]["status"] == 503
+
+
+def test_cache_falls_back_to_stale_page(server, monkeypatch, tmp_path):
+    monkeypatch.setattr(http_cache, "MODE", "revalidate")
+    monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(FlakyHandler, "FAILURES", 0)
+    url = server + "/cached"
+    assert http_fetch.get_request(url).text == "<html>ok</html>"
+
+    #every revalidation is sent, even right after the fetch
+    monkeypatch.setattr(FlakyHandler, "FAILURES", 10)
+    r = http_fetch.get_request(url, retries=0)
+    assert FlakyHandler.hits["/cached"] == 2
+    assert r is not None and r.text == "<html>ok</html>"
@@ -0,0 +1,68 @@
+"""
+Tests of the crawler against a local HTTP server serving a county page
+"""
+
+import http.server
+import os
+import pandas as pd
+import pytest
+import http_cache
+import http_fetch
+import lw_crawler
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+RAW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "raw_data")
+
+
+class CountyHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Serves the Adams County page under /counties/, except for
+    /counties/down which always answers 503.
+    '''
+    hits = {}
+
+    def do_GET(self):
+        CountyHandler.hits[self.path] = CountyHandler.hits.get(self.path, 0) + 1
+        if self.path == "/counties/down":
+            status, body = 503, b"unavailable"
+        else:
+            status = 200
+            with open(os.path.join(TEST_DATA, "adams_county_il.html"), "rb") as file:
+                body = file.read()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(serve, monkeypatch):
+    CountyHandler.hits = {}
+    monkeypatch.setattr(http_cache, "MODE", "off")
+    monkeypatch.setattr(http_fetch, "BACKOFF", 0.01)
+    monkeypatch.setattr(http_fetch, "MIN_INTERVAL", 0)
+    return serve(CountyHandler)
+
+
+def test_sequential_and_concurrent_crawls_match(server):
+    links = [server + "/counties/17001", server + "/counties/down"]
+    sequential_df = lw_crawler.create_full_dataframe(links, max_workers=1)
+    concurrent_df = lw_crawler.create_full_dataframe(links, max_workers=4)
+    pd.testing.assert_frame_equal(sequential_df, concurrent_df)
+
+    #the page's rows are the ones in the saved raw data
+    lw_df = pd.read_csv(os.path.join(RAW_DIR, "living_wage_data.csv"))
+    expected_df = lw_df[lw_df["County"] == "Adams County"].reset_index(drop=True)
+    pd.testing.assert_frame_equal(concurrent_df.reset_index(drop=True), expected_df,
+                                  check_dtype=False)
+
+
+def test_failed_page_is_not_fetched_again(server):
+    df = lw_crawler.create_full_dataframe([server + "/counties/down"], max_workers=2)
+
+    assert df.empty
+    assert CountyHandler.hits["/counties/down"] == http_fetch.RETRIES + 1
@@ -0,0 +1,45 @@
+"""
+Tests of the scenario server on a small synthetic data set
+"""
+
+import pytest
+import gen_agg_data
+import scenario_server
+import update_counties
+
+
+@pytest.fixture
+def server(tmp_path, write_synthetic):
+    raw_dir, clean_dir = str(tmp_path / "raw"), str(tmp_path / "clean")
+    write_synthetic(raw_dir)
+    update_counties.go(15, raw_dir, clean_dir)
+    server = scenario_server.start(clean_dir, port=0)
+    yield server, raw_dir, clean_dir
+    server.shutdown()
+    server.server_close()
+
+
+def test_results_are_bounded(server, monkeypatch):
+    server, _, _ = server
+    monkeypatch.setattr(server.data, "max_results", 2)
+    for new_wage in [12, 13, 14, 13]:
+        scenario_server.get_scenario(scenario_server.url(server), new_wage)
+
+    assert [key[1] for key in server.data.results] == [14, 13]
+    assert server.data.summary()["computed"] == 3
+
+
+def test_rewritten_store_is_reloaded(server, write_synthetic, tmp_path):
+    server, raw_dir, clean_dir = server
+    before_df = scenario_server.get_scenario(scenario_server.url(server), 15)
+
+    write_synthetic(raw_dir, changed_county="County 01001")
+    update_counties.go(15, raw_dir, clean_dir)
+    after_df = scenario_server.get_scenario(scenario_server.url(server), 15)
+
+    expected_df = gen_agg_data.go(15, filename=str(tmp_path / "master.csv"), raw_dir=raw_dir,
+                                  clean_dir=clean_dir, use_cache=False)
+    assert server.data.summary()["reloads"] == 1
+    assert not after_df.equals(before_df)
+    assert after_df["LB LW Agg Income"].tolist() == \
+        expected_df["LB LW Agg Income"].tolist()
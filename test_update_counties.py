@@ -0,0 +1,31 @@
+"""
+Tests of the incremental update of the clean data
+"""
+
+import os
+import pandas as pd
+import update_counties
+
+
+def read_master(clean_dir):
+    master_df = pd.read_csv(os.path.join(clean_dir, "master_data.csv"), dtype={"FIP": str})
+    return master_df.sort_values("County").reset_index(drop=True)
+
+
+def test_new_wage_and_changed_county(tmp_path, write_synthetic):
+    raw_dir, clean_dir = str(tmp_path / "raw"), str(tmp_path / "clean")
+    write_synthetic(raw_dir)
+    assert update_counties.go(15, raw_dir, clean_dir)["full"]
+
+    #the first county in the master data is one of the changed ones, so
+    #its rows are at the new wage before the other counties are
+    write_synthetic(raw_dir, changed_county="County 01001")
+    status = update_counties.go(16, raw_dir, clean_dir)
+    assert status == {"changed": ["County 01001"], "removed": [], "full": False}
+
+    master_df = read_master(clean_dir)
+    assert (master_df["Entered Wage"] == 16).all()
+
+    full_dir = str(tmp_path / "full")
+    update_counties.go(16, raw_dir, full_dir)
+    pd.testing.assert_frame_equal(master_df, read_master(full_dir))
@@ -0,0 +1,219 @@
+"""
+Incremental update of the clean data when the inputs of some counties
+change
+
+The raw data of each county (its Census income and household size rows,
+its county_info entry and its MIT living wages) is hashed together with
+the employment model and the hashes are kept in clean_data. On the next
+run only the counties whose hash changed, was added or disappeared are
+recomputed: their living wages in living_wages_by_county.json, their
+rows of hh_level_data and hh_level_data_w_lw (see
+hh_store.replace_counties) and their rows of the master data. Household
+expansion and the unemployment draws of a county do not depend on the
+other counties, so the result is the same as regenerating everything.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import pandas as pd
+import employment_model
+import gen_agg_data
+import gen_hh_level_data
+import gen_lw_dict
+import hh_store
+
+FINGERPRINT_FILE = "county_fingerprints.json"
+
+
+def go(new_wage=15, raw_dir="raw_data", clean_dir="clean_data", file_format="store",
+       model=employment_model.CBO):
+    '''
+    Brings the clean data up to date with the raw data, recomputing only
+    the counties whose inputs changed since the last run. The first run
+    (or one with clean data missing) generates everything.
+
+    Inputs:
+        - new_wage (int): proposed new federal minimum wage of the master
+                          data, all its rows are recomputed if it
+                          differs from the wage of the saved master data
+        - raw_dir, clean_dir (string): directories of the raw and clean data
+        - file_format (string): format of the hh-level data, see hh_store
+        - model (dictionary): coefficients of the employment model, a new
+                              model changes every county
+    Outputs:
+        - (dictionary) "changed" and "removed" counties, and "full" if
+                       everything was generated
+    '''
+    raw_data = read_raw(raw_dir)
+    fingerprints = county_fingerprints(*raw_data, model)
+    files = clean_files(clean_dir, file_format)
+
+    old_fingerprints = None
+    if all(os.path.exists(f) for f in files.values()):
+        try:
+            with open(os.path.join(clean_dir, FINGERPRINT_FILE), "r") as file:
+                old_fingerprints = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    if old_fingerprints is None:
+        generate_all(raw_data, new_wage, raw_dir, clean_dir, file_format, model)
+        status = {"changed": sorted(fingerprints), "removed": [], "full": True}
+    else:
+        changed = sorted(county for county, fp in fingerprints.items()
+                         if old_fingerprints.get(county) != fp)
+        removed = sorted(set(old_fingerprints) - set(fingerprints))
+        #read before update, which writes the changed counties at new_wage
+        master_wage = pd.read_csv(files["master"], usecols=["Entered Wage"])["Entered Wage"]
+        update(raw_data, changed, removed, new_wage, clean_dir, file_format, model)
+        status = {"changed": changed, "removed": removed, "full": False}
+
+        if (master_wage != new_wage).any():
+            gen_agg_data.go(new_wage, filename=files["master"], file_format=file_format,
+                            raw_dir=raw_dir, clean_dir=clean_dir, model=model)
+
+    with open(os.path.join(clean_dir, FINGERPRINT_FILE), "w") as file:
+        json.dump(fingerprints, file)
+
+    return status
+
+
+def read_raw(raw_dir="raw_data"):
+    '''
+    Reads the Census and MIT Living Wage raw data
+
+    Inputs:
+        - raw_dir (string): raw data directory
+    Outputs:
+        - (tuple) income buckets, household sizes, county info and living
+                  wage DataFrame
+    '''
+    raw_data = []
+    for name in ["income_buckets.json", "household_sizes.json", "county_info.json"]:
+        with open(os.path.join(raw_dir, name), "r") as file:
+            raw_data.append(json.load(file))
+    raw_data.append(pd.read_csv(os.path.join(raw_dir, "living_wage_data.csv")))
+    return tuple(raw_data)
+
+
+def clean_files(clean_dir, file_format):
+    '''
+    Files of the clean data an update writes to
+    '''
+    ext = ".csv" if file_format == "csv" else ""
+    return {"lw_dict": os.path.join(clean_dir, "living_wages_by_county.json"),
+            "hh": os.path.join(clean_dir, "hh_level_data") + ext,
+            "hh_lw": os.path.join(clean_dir, "hh_level_data_w_lw") + ext,
+            "master": os.path.join(clean_dir, "master_data.csv")}
+
+
+def county_fingerprints(income_status, household_sizes, county_info, living_wage_df,
+                        model=employment_model.CBO):
+    '''
+    Hash of the raw data of each county
+
+    Inputs:
+        - income_status, household_sizes, county_info, living_wage_df:
+              raw data (see read_raw)
+        - model (dictionary): coefficients of the employment model
+    Outputs:
+        - (dictionary) county name to hex digest
+    '''
+    hh_sizes = {hh["county"]: hh for hh in household_sizes}
+    living_wages = {county: lw_df.to_dict(orient="records")
+                    for county, lw_df in living_wage_df.groupby("County")}
+
+    fingerprints = {}
+    for income in income_status:
+        code = income["county"]
+        name = next(iter(county_info[code]))
+        inputs = [code, county_info[code], income, hh_sizes.get(code),
+                  living_wages.get(name), model]
+        fingerprints[name] = hashlib.sha256(json.dumps(inputs, sort_keys=True)
+                                            .encode()).hexdigest()
+    return fingerprints
+
+
+def generate_all(raw_data, new_wage, raw_dir, clean_dir, file_format, model):
+    '''
+    Generates all the clean data from the raw data, as the pipeline does
+    '''
+    income_status, household_sizes, county_info, living_wage_df = raw_data
+    os.makedirs(clean_dir, exist_ok=True)
+    living_wage_dict = gen_lw_dict.go(os.path.join(clean_dir, "living_wages_by_county.json"),
+                                      [dict(hh) for hh in household_sizes],
+                                      county_info, living_wage_df)
+    hh_df = gen_hh_level_data.go(os.path.join(clean_dir, "hh_level_data"), file_format,
+                                 income_status, county_info)
+    gen_agg_data.gen_lw_data(file_format, hh_df, living_wage_dict, clean_dir, model)
+    gen_agg_data.go(new_wage, filename=os.path.join(clean_dir, "master_data.csv"),
+                    file_format=file_format, raw_dir=raw_dir, clean_dir=clean_dir,
+                    model=model)
+
+
+def update(raw_data, changed, removed, new_wage, clean_dir="clean_data", file_format="store",
+           model=employment_model.CBO):
+    '''
+    Recomputes the clean data of some counties and splices it into the
+    saved clean data
+
+    Inputs:
+        - raw_data (tuple): raw data (see read_raw)
+        - changed (list of strings): counties to recompute
+        - removed (list of strings): counties to drop
+        - new_wage (int): proposed new federal minimum wage
+        - clean_dir (string): directory of the clean data
+        - file_format (string): format of the hh-level data, see hh_store
+        - model (dictionary): coefficients of the employment model
+    '''
+    if not changed and not removed:
+        return
+    income_status, household_sizes, county_info, living_wage_df = raw_data
+    codes = {code for code, info in county_info.items() if next(iter(info)) in changed}
+    files = clean_files(clean_dir, file_format)
+
+    with open(files["lw_dict"], "r") as file:
+        living_wage_dict = json.load(file)
+    for county in removed:
+        living_wage_dict.pop(county, None)
+    if changed:
+        hh_size_data = gen_lw_dict.process_hh_type_county(
+            [dict(hh) for hh in household_sizes if hh["county"] in codes], county_info)
+        living_wage_dict.update(gen_lw_dict.compile_wages(
+            living_wage_df[living_wage_df["County"].isin(changed)], hh_size_data))
+    with open(files["lw_dict"], "w") as file:
+        json.dump(living_wage_dict, file)
+
+    hh_df, hh_lw_df = None, None
+    if changed:
+        c_df = gen_hh_level_data.process_income_data(
+            [income for income in income_status if income["county"] in codes], county_info)
+        hh_df = gen_hh_level_data.gen_hh_data(c_df)
+    hh_store.replace_counties(hh_df, os.path.join(clean_dir, "hh_level_data"), file_format,
+                              removed)
+
+    if changed:
+        hh_df["index"] = hh_df.index
+        hh_df = hh_df.rename(columns={"Predicted Salary": "Current Agg Income"})
+        hh_lw_df = gen_agg_data.create_lw_vars(hh_df, living_wage_dict, model)
+    hh_store.replace_counties(hh_lw_df, os.path.join(clean_dir, "hh_level_data_w_lw"),
+                              file_format, removed, model)
+
+    master_df = pd.read_csv(files["master"], dtype={"FIP": str})
+    master_df = master_df[~master_df["County"].isin(changed + removed)]
+    if changed:
+        agg_df = gen_agg_data.agg_data(gen_agg_data.create_new_wage_vars(hh_lw_df, new_wage,
+                                                                         model))
+        master_df = pd.concat([master_df, gen_agg_data.gen_new_vars(agg_df)],
+                              ignore_index=True)
+    master_df.sort_values("County").to_csv(files["master"], index=False)
+
+
+if __name__ == "__main__":
+    usage = "python3 update_counties.py [wage] [raw_dir] [clean_dir]"
+    new_wage = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    status = go(new_wage, *sys.argv[2:4])
+    print("Generated all counties" if status["full"] else
+          f"Updated {len(status['changed'])} counties, removed {len(status['removed'])}")
